@@ -7,9 +7,25 @@ from scipy.interpolate import interp1d
 from math import cos, sin
 from matplotlib import cm
 import math
+from malla import MallaCilindrica, MallaAdaptativa, interpolate_temperature, Resumen, procesar_por_bloques
+from planilla import leer_planilla
 #from modulo_swelling import calculate_swelling
 
-puntos = []
+
+#SALIDA DE RESULTADOS
+formato_salida = 'npy'      # 'npy' (binario, puntos.npy) o 'txt' (puntos.txt)
+
+#PROCESAMIENTO POR BLOQUES: genera y procesa la malla por capas de altura, la memoria no depende del tamanio de la malla
+por_bloques = False
+capas_por_bloque = 1
+bins_temperatura = np.arange(200, 701, 10)  # bordes del histograma de temperatura
+
+#MALLA ADAPTATIVA: parte de una malla gruesa y divide las celdas donde la temperatura se aparta de una variacion trilineal
+malla_adaptativa = False
+pasos_iniciales = (8, 4, 4)         # (angulares, radiales, altura) de la malla gruesa
+tolerancia_malla = 0.5              # error de interpolacion trilineal maximo de la temperatura en una celda (grados C)
+niveles_malla = 4                   # divisiones sucesivas maximas
+comparar_uniforme = True            # informa la diferencia de volumen con swelling contra la malla uniforme (GEOMETRIA DE LA PIEZA)
 
 #GEOMETRIA DE LA PIEZA
 r= 5
@@ -66,9 +82,8 @@ def get_data():
 
     f.close()
 
-    data = pd.read_excel('MOD-TB-DPA&HEvsT.xlsx', engine='openpyxl')
+    data = leer_planilla('MOD-TB-DPA&HEvsT.xlsx')          # cache binaria de la planilla (ver planilla.py)
     time = data['t'].tolist()
-    data = data.set_index('t')
     material = '347-1'
     dpa = np.array(data[material + ' dpa'])
     he = np.array(data[material + ' He [appm]'])
@@ -80,106 +95,46 @@ parametros = get_data()
 app = 56.25
 
 
-class Punto:
-    global r,h,reference_curves, paso_altura, paso_radial, paso_angular, radios
-
-    def __init__(self, x, y, z, r, phi) -> None:
-        
-        self.x = x
-        self.y = y 
-        self.z = z 
-        self.r = r
-        self.indice_en_radios = radios.index(self.r)
-
-        self.rho = (x**2 + y**2 + z**2)**(1/2)
-        self.phi = phi
-        self.T = self.interpolate_temperature()
+def calculate_attenuation(malla):
+    #calcula la atenuacion del dpa en base a la curva de penetracion (solo depende del radio del anillo)
 
-        self.area = math.radians(360/paso_angular)/2 * (radios[self.indice_en_radios]**2 - radios[self.indice_en_radios-1]**2)
-        self.h = (h/paso_altura)
-        self.vol = self.h*self.area
+    return (1 - malla['r']/r)
 
-        #calculo de swelling para teol=56.25 y atenuacion = 0 (sin tener en cuenta el efecto de la atenuacion del danio en la penetracion)
-        self.vol_after = self.swelling()
 
-        #swelling teniendo en cuenta la penetracion neutronica
-        #self.atenuacion = self.calculate_attenuation()
-        #self.vol_after2 = self.vol * (1 + calculate_swelling(app, self.atenuacion, self.T, parametros))
+class GenDistribucion(MallaCilindrica):
+    """
+    Particion del cilindro en volumenes (columnas de NumPy, ver malla.MallaCilindrica) con su temperatura y volumen final.
+    Iterar la distribucion devuelve vistas con los mismos atributos que tenia Punto (p.x, p.T, p.vol, ...).
+    """
 
-    #Calcular la temperatura interpolando las 4 curvas mas cercanas, utilizando el metodo de interpolacion bilineal
-    def interpolate_temperature(self):
-            # Verificar si el punto coincide con alguno de los puntos de referencia
-        for curva in reference_curves:
-            if (self.x, self.y) == (curva[0], curva[1]):
-                return curva[2](self.z)
+    def __init__(self, radio, altura, pasos_angulares, pasos_radiales, pasos_altura, capas=None) -> None:
 
-            # Calcular la distancia desde el punto intermedio (x, y) a cada uno de los puntos de referencia
-            distances = [math.sqrt((self.x - curva[0])**2 + (self.y - curva[1])**2) for curva in reference_curves]
+        super().__init__(radio, altura, pasos_angulares, pasos_radiales, pasos_altura, capas)
 
-            # Realizar la interpolación ponderada
-            t_interpolated = sum([curva[2](self.z) / distance for curva, distance in zip(reference_curves, distances)]) / sum([1 / distance for distance in distances])
+        #temperatura de cada punto: interpolacion de las curvas de referencia ponderada por la inversa de la distancia
+        self['T'] = interpolate_temperature(reference_curves, self['x'], self['y'], self['z'])
 
-        return t_interpolated
-
-        # Ejemplo de puntos y temperaturas de referencia (tuplas: (x, y, t))
-    
-    def swelling(self):
-        
-        return self.vol * (1 + swelling(self.T)/100)
-        
-    def calculate_attenuation(self):
-        #calcula la atenuacion del dpa en base a la curva de penetracion
-
-        fuente_x = 0
-        fuente_y = 0
-        fuente_z = 0
-        d = ((self.x - fuente_x)**2 + (self.y - fuente_y)**2 + (self.z-fuente_z)**2)**0.5
-
-        return (1 - self.r/r)
-        
-    def __repr__(self) -> str:
-     
-        return (f'(x: {self.x}, y: {self.y}, z: {self.z}, phi: {self.phi}), r: {self.r}, h: {self.h}, indice: {self.indice_en_radios}\nArea: {self.area}, volumen: {self.vol}\n')
-    
-
-class GenDistribucion:
-
-    def __init__(self, radio, altura, pasos_angulares, pasos_radiales, pasos_altura) -> None:
-
-        self.radio = radio
-        self.altura = altura
-        self.paso_angular = pasos_angulares
-        self.paso_radial = pasos_radiales
-        self.paso_h = pasos_altura
-
-        self.construct_geometry()
-        
-
-    def construct_geometry(self):
-
-        #por cada paso en altura ...
-        for z in range(self.paso_h):
-            #por cada paso en el radio ...
-            for i in range(1,self.paso_radial+1):
-                rad = (i+1)*(self.radio/self.paso_radial)
-                #por cada paso de angulo ...
-                for j in range(self.paso_angular):
-
-                    delta_phi = 2*np.pi/self.paso_angular
+        #calculo de swelling para teol=56.25 y atenuacion = 0 (sin tener en cuenta el efecto de la atenuacion del danio en la penetracion)
+        self['vol_after'] = self['vol'] * (1 + swelling(self['T'])/100)
 
-                    angulo_actual = delta_phi*(j+1)*180/np.pi
-                    
+        #swelling teniendo en cuenta la penetracion neutronica
+        #self['atenuacion'] = calculate_attenuation(self)
+        #self['vol_after2'] = self['vol'] * (1 + np.array([calculate_swelling(app, a, T, parametros) for a, T in zip(self['atenuacion'], self['T'])]))
 
-                    x= rad*cos(delta_phi*(j+1))
-                    y= rad*sin(delta_phi*(j+1))
-                    h= z *(self.altura/self.paso_h)
 
-                    r = i * self.radio/self.paso_radial
+class GenDistribucionAdaptativa(MallaAdaptativa):
+    """
+    Igual que GenDistribucion pero sobre una malla adaptativa (ver malla.MallaAdaptativa): las celdas se refinan donde
+    la temperatura interpolada se aparta de una variacion trilineal mas que la tolerancia.
+    """
 
+    def __init__(self, radio, altura, pasos_angulares, pasos_radiales, pasos_altura, tolerancia, niveles) -> None:
 
-                    p = Punto(x,y,h,r, angulo_actual)
+        super().__init__(radio, altura, pasos_angulares, pasos_radiales, pasos_altura,
+                         campo=lambda x, y, z: interpolate_temperature(reference_curves, x, y, z),
+                         tolerancia=tolerancia, niveles=niveles)
 
-                    puntos.append(p) #if 180>angulo_actual>0 else None
+        self['vol_after'] = self['vol'] * (1 + swelling(self['T'])/100)
 
 
 def plot_3d_points(puntos):
@@ -249,27 +204,59 @@ def plot_3d_points_with_temperature(points):
 
 
 
-distribucion = GenDistribucion(radio= r, altura= h, pasos_angulares=paso_angular, pasos_radiales=paso_radial, pasos_altura=paso_altura)
+def escribir_txt(puntos):
+    with open('puntos.txt', 'a') as p:
+        for punto in puntos:
+            p.write(f'x:{punto.x}, y:{punto.y}, z:{punto.z}, T:{punto.T}, V_before:{punto.vol}, V_after:{punto.vol_after}\n')
+
+
+if por_bloques:
+    #cada bloque se genera, se calcula, se escribe y se descarta; solo se guardan las reducciones
+    resumen = procesar_por_bloques(lambda desde, hasta: GenDistribucion(radio= r, altura= h, pasos_angulares=paso_angular, pasos_radiales=paso_radial, pasos_altura=paso_altura, capas=(desde, hasta)),
+                                   paso_altura, capas_por_bloque, Resumen(bins_temperatura),
+                                   ruta='puntos.npy' if formato_salida == 'npy' else None,
+                                   escribir_bloque=escribir_txt if formato_salida == 'txt' else None)
+    vol_calculado = resumen.vol
+    vol_after_swelling = resumen.vol_after
+else:
+    if malla_adaptativa:
+        distribucion = GenDistribucionAdaptativa(radio= r, altura= h, pasos_angulares=pasos_iniciales[0], pasos_radiales=pasos_iniciales[1],
+                                                 pasos_altura=pasos_iniciales[2], tolerancia=tolerancia_malla, niveles=niveles_malla)
+        print('celdas de la malla adaptativa: ', len(distribucion), ' por nivel: ', np.bincount(distribucion['nivel']))
+        if comparar_uniforme:
+            uniforme = GenDistribucion(radio= r, altura= h, pasos_angulares=paso_angular, pasos_radiales=paso_radial, pasos_altura=paso_altura)
+            vol_after_uniforme = uniforme['vol_after'].sum()
+            print('volumen con swelling, malla uniforme ({} celdas): '.format(len(uniforme)), vol_after_uniforme)
+            print('diferencia adaptativa - uniforme (%): ', (distribucion['vol_after'].sum()/vol_after_uniforme - 1)*100)
+    else:
+        distribucion = GenDistribucion(radio= r, altura= h, pasos_angulares=paso_angular, pasos_radiales=paso_radial, pasos_altura=paso_altura)
+    puntos = distribucion       # iterable de puntos, para las funciones de graficacion
+
+    #plt.figure(figsize=(12,12))
+
+    #plot_3d_points(puntos)
+    #plot_3d_points_with_temperature(puntos)
 
-#plt.figure(figsize=(12,12))
-
-#plot_3d_points(puntos)
-#plot_3d_points_with_temperature(puntos)
+    #plt.show()
 
-#plt.show()
+    vol_calculado = distribucion['vol'].sum()
+    vol_after_swelling = distribucion['vol_after'].sum()
 
 vol_cilindro = np.pi*(r**2)*h
-vol_calculado = sum([p.vol for p in puntos])
 error = abs((vol_cilindro - vol_calculado)/vol_cilindro)*100
 
-vol_after_swelling = sum([p.vol_after for p in puntos])
-
 print('volumen real del cilindro: ', vol_cilindro)
 print('volumen calculado: ', vol_calculado)
 print('error en el calculo del volumen (%): ', error)
 print('volumen con swelling: ', vol_after_swelling)
 print('aumento de volumen total (%): ', ((vol_after_swelling/vol_cilindro) -1)*100)
 
-with open('puntos.txt', 'a') as p:
-    for punto in puntos:
-        p.write(f'x:{punto.x}, y:{punto.y}, z:{punto.z}, T:{punto.T}, V_before:{punto.vol}, V_after:{punto.vol_after}\n')
+#SALIDA: 'npy' guarda las columnas en binario (puntos.npy, se lee con malla.leer_puntos), 'txt' agrega una linea por punto a puntos.txt
+if por_bloques:
+    print('temperatura minima / maxima: ', resumen.T_min, resumen.T_max)
+    print('swelling minimo / maximo (%): ', resumen.swelling_min, resumen.swelling_max)
+    print('histograma de temperatura: ', resumen.histograma)
+elif formato_salida == 'npy':
+    distribucion.guardar('puntos.npy', ("x", "y", "z", "T", "vol", "vol_after"))
+else:
+    escribir_txt(puntos)
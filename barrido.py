@@ -0,0 +1,150 @@
+"""
+Barridos de parametros del material (omega, efv, e, r, rM, N0, f, ...) para estudios de sensibilidad.
+
+Cada caso es un diccionario {parametro: valor} que reemplaza a los valores base de datos.txt. Los casos se generan
+como grilla (producto cartesiano) o como hipercubo latino, y cada uno se evalua sobre todo el eje de temperaturas
+a la vez con CavitySwelling.run_batch (vectorizado sobre las temperaturas; coincide con run() salvo por redondeo, que por
+encima de ~580 C se amplifica, ver CavitySwelling.run_batch). Los casos se pueden repartir en un pool de procesos.
+
+Todos los resultados quedan en un unico archivo .npz (ver barrer y leer_barrido).
+
+"""
+
+import itertools
+from multiprocessing import Pool, cpu_count, freeze_support
+from timeit import default_timer as timer
+
+import numpy as np
+
+from swelling import CavitySwelling
+from run_mtsf import readString, readFit, readHeader
+
+
+# Nombres de datos.txt que CavitySwelling recibe con otro nombre
+ALIAS = {"N0": "_N0"}
+
+
+def grilla_parametros(**valores) -> list:
+    """ Producto cartesiano de los valores de cada parametro, ej. grilla_parametros(efv=[1.5, 1.6], e=[1.3, 1.4]) -> 4 casos. """
+    nombres = list(valores)
+    return [dict(zip(nombres, combinacion)) for combinacion in itertools.product(*valores.values())]
+
+
+def hipercubo_latino(rangos: dict, muestras: int, logaritmicos: tuple = (), semilla: int = None) -> list:
+    """
+    Muestreo por hipercubo latino: cada rango {parametro: (min, max)} se divide en muestras intervalos iguales, se toma un
+    valor al azar en cada uno y los intervalos se combinan en orden aleatorio entre parametros.
+
+        logaritmicos: parametros que se muestrean en escala logaritmica (por ejemplo N0).
+
+        semilla: semilla del generador, para repetir el muestreo.
+    """
+    rng = np.random.default_rng(semilla)
+    columnas = {}
+    for nombre, (minimo, maximo) in rangos.items():
+        u = (rng.permutation(muestras) + rng.random(muestras)) / muestras
+        if nombre in logaritmicos:
+            columnas[nombre] = np.exp(np.log(minimo) + u * (np.log(maximo) - np.log(minimo)))
+        else:
+            columnas[nombre] = minimo + u * (maximo - minimo)
+    return [{nombre: float(columnas[nombre][i]) for nombre in rangos} for i in range(muestras)]
+
+
+def correr_caso(he, dpa, base: dict, caso: dict, temperaturas) -> tuple:
+    """
+    Evalua un caso sobre todas las temperaturas (grados C) con run_batch.
+    Devuelve (swelling de fin de vida [%], deol, ok, tiempo [s]), los tres primeros con una posicion por temperatura.
+    """
+    parametros = dict(base)
+    parametros.update({ALIAS.get(k, k): v for k, v in caso.items()})
+    start = timer()
+    cs = CavitySwelling(he, dpa, z=temperaturas[0] + 273, **parametros)
+    res = cs.run_batch(np.asarray(temperaturas) + 273)
+    return res["AGBS"][:, cs.pasos] * 100, res["deol"], res["ok"], timer() - start
+
+
+def _correr_caso(argumentos: tuple) -> tuple:
+    return correr_caso(*argumentos)
+
+
+def barrer(he, dpa, base: dict, casos: list, temperaturas=range(200, 660, 10), procesos: int = 1, archivo: str = None) -> dict:
+    """
+    Evalua todos los casos sobre el eje de temperaturas.
+
+        base: argumentos de CavitySwelling comunes a todos los casos (ver run_mtsf.readHeader).
+
+        casos: lista de {parametro: valor} (grilla_parametros o hipercubo_latino). N0 se acepta como nombre de _N0.
+
+        procesos: 1 corre en este proceso, > 1 (o None -> cpu_count()) reparte los casos en un pool.
+
+        archivo: si se da, guarda el resultado en ese .npz.
+
+    Devuelve {'T': temperaturas [C], 'swelling': casos x T [%], 'deol': casos x T, 'ok': casos x T, 'tiempo': tiempo por caso [s],
+    'parametros': nombres de los parametros barridos, y una columna por parametro con su valor en cada caso}.
+    Las temperaturas en las que el calculo falla quedan con ok == False y NaN.
+    """
+    temperaturas = [float(t) for t in temperaturas]
+    tareas = [(he, dpa, base, caso, temperaturas) for caso in casos]
+    if procesos == 1:
+        filas = [correr_caso(*tarea) for tarea in tareas]
+    else:
+        with Pool(processes=procesos or cpu_count()) as pool:
+            filas = pool.map(_correr_caso, tareas)
+
+    nombres = sorted({k for caso in casos for k in caso})
+    resultado = {
+        "T": np.array(temperaturas),
+        "swelling": np.array([f[0] for f in filas]).reshape(len(casos), len(temperaturas)),
+        "deol": np.array([f[1] for f in filas]).reshape(len(casos), len(temperaturas)),
+        "ok": np.array([f[2] for f in filas], dtype=bool).reshape(len(casos), len(temperaturas)),
+        "tiempo": np.array([f[3] for f in filas]),
+        "parametros": np.array(nombres),
+    }
+    for nombre in nombres:
+        resultado[nombre] = np.array([caso.get(nombre, base.get(ALIAS.get(nombre, nombre), np.nan)) for caso in casos], dtype=float)
+
+    if archivo is not None:
+        np.savez(archivo, **resultado)
+    return resultado
+
+
+def leer_barrido(archivo: str) -> dict:
+    """ Lee un archivo guardado por barrer. """
+    with np.load(archivo) as data:
+        return {k: data[k] for k in data.files}
+
+
+if __name__ == '__main__':
+    freeze_support()
+
+    # Ejemplo: hipercubo latino alrededor de los valores de datos.txt para el primer ajuste
+    muestras = 20
+    rangos = {"omega": (1.0E-29, 1.3E-29), "efv": (1.5, 1.7), "e": (1.3, 1.5), "r": (300, 460),
+              "rM": (4000, 6000), "N0": (3E14, 1.2E15), "f": (0.8, 1.2)}
+    procesos = None
+    fi = 0.01
+    verificar = False       # True compara run_batch contra run() para los valores base antes del barrido (ver verificar_batch)
+
+    with open("datos.txt") as f:
+        modo, base = readHeader(f)
+        titulo = readString(f)
+        he = readFit(f)
+        dpa = readFit(f)
+    base["fi"] = fi
+
+    if verificar:
+        distintas = CavitySwelling(he, dpa, z=473, **base).verificar_batch()
+        print("run_batch coincide con run()" if not distintas else "run_batch difiere de run() en: {}".format(distintas))
+
+    casos = hipercubo_latino(rangos, muestras, logaritmicos=("N0",), semilla=0)
+    res = barrer(he, dpa, base, casos, procesos=procesos, archivo="barrido_{}_{}.npz".format(modo, titulo))
+
+    swell = np.where(res["ok"], res["swelling"], -np.inf)
+    for i in range(len(casos)):
+        if not res["ok"][i].any():
+            print("caso {:3d}  fallaron todas las temperaturas  {:.3f} s".format(i, res["tiempo"][i]))
+            continue
+        pico = np.argmax(swell[i])
+        print("caso {:3d}  T pico {:5.0f} C  swelling max {:8.3f} %  fallas {:2d}  {:.3f} s".format(
+            i, res["T"][pico], res["swelling"][i, pico], int((~res["ok"][i]).sum()), res["tiempo"][i]))
+    print("tiempo total de calculo: {:.3f} s".format(res["tiempo"].sum()))
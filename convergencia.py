@@ -0,0 +1,99 @@
+"""
+Estudio de convergencia temporal del calculo de swelling.
+
+Para cada ajuste de datos.txt corre el barrido de temperaturas con distintas cantidades de pasos (integrador de Euler)
+y con distintas tolerancias (integrador adaptativo), y compara el swelling de fin de vida contra una corrida de referencia
+con el integrador adaptativo a tolerancia muy chica. Informa el tiempo de cada barrido y el error, y sugiere la resolucion
+mas barata que cumple con el error objetivo.
+
+"""
+
+import os
+from timeit import default_timer as timer
+
+import tabulate
+
+from swelling import CavitySwelling
+from run_mtsf import readString, readFit, readHeader
+
+
+resoluciones = [25, 50, 100, 200, 400, 800]    # pasos del integrador de Euler
+tolerancias = [1E-2, 1E-3, 1E-4]               # tolerancias del integrador adaptativo
+tolerancia_referencia = 1E-8                   # corrida de referencia (adaptativo)
+temperaturas = range(200, 660, 10)             # grados C, igual que run_mtsf
+fi = 0.01                                      # fraccion inicial
+objetivo = 1E-2                                # error relativo maximo admitido en el swelling de fin de vida
+outdir = "out_convergencia"
+
+
+def barrido(he, dpa, parametros: dict, **integracion) -> tuple:
+    """
+    Corre CavitySwelling para todas las temperaturas con las opciones de integracion dadas (pasos, integrador, tolerancia, ...).
+    Devuelve ({T: swelling de fin de vida [%] o None si el calculo falla}, tiempo total [s], evaluaciones del modelo).
+    """
+    swell = {}
+    evaluaciones = 0
+    start = timer()
+    for t in temperaturas:
+        cs = CavitySwelling(he, dpa, z=t + 273, **parametros, **integracion)
+        try:
+            cs.run(silent=True)
+        except Exception:
+            swell[t] = None
+            continue
+        swell[t] = cs.AGBS[cs.pasos] * 100
+        evaluaciones += cs.integracion['evaluaciones']
+    return swell, timer() - start, evaluaciones
+
+
+def error(swell: dict, referencia: dict) -> tuple:
+    """ Devuelve (error relativo maximo, error relativo medio, T del maximo, temperaturas comparadas). """
+    errores = {t: abs(swell[t] - referencia[t]) / abs(referencia[t]) for t in temperaturas
+               if swell[t] is not None and referencia[t] not in (None, 0)}
+    if not errores:
+        return None, None, None, 0
+    tMax = max(errores, key=errores.get)
+    return errores[tMax], sum(errores.values()) / len(errores), tMax, len(errores)
+
+
+def convergencia(he, dpa, parametros: dict) -> list:
+    """
+    Compara todas las resoluciones contra la referencia.
+    Devuelve una fila por resolucion: [integrador, pasos o tolerancia, tiempo, evaluaciones, error max, error medio, T del max, comparadas].
+    """
+    referencia = barrido(he, dpa, parametros, integrador='adaptativo', tolerancia=tolerancia_referencia, paso_min=1E-6)[0]
+
+    filas = []
+    casos = [('euler', p, {'pasos': p}) for p in resoluciones]
+    casos += [('adaptativo', tol, {'integrador': 'adaptativo', 'tolerancia': tol}) for tol in tolerancias]
+    for integrador, valor, opciones in casos:
+        swell, tiempo, evaluaciones = barrido(he, dpa, parametros, **opciones)
+        filas.append([integrador, valor, tiempo, evaluaciones, *error(swell, referencia)])
+    return filas
+
+
+def recomendar(filas: list):
+    """ Devuelve la fila mas rapida cuyo error maximo es <= objetivo (None si ninguna lo cumple). """
+    validas = [f for f in filas if f[4] is not None and f[4] <= objetivo]
+    return min(validas, key=lambda f: f[2]) if validas else None
+
+
+if __name__ == '__main__':
+    header = ["integrador", "pasos / tol", "tiempo [s]", "evaluaciones", "error max", "error medio", "T error max [C]", "T comparadas"]
+    os.makedirs(outdir, exist_ok=True)
+    with open("datos.txt") as f:
+        modo, parametros = readHeader(f)
+        parametros["fi"] = fi
+        while (line := readString(f)):
+            he = readFit(f)
+            dpa = readFit(f)
+            filas = convergencia(he, dpa, parametros)
+            tabla = tabulate.tabulate(filas, headers=header)
+            mejor = recomendar(filas)
+            sugerencia = ("resolucion mas barata con error max <= {:g}: {} {}".format(objetivo, mejor[0], mejor[1]) if mejor
+                          else "ninguna resolucion cumple error max <= {:g}".format(objetivo))
+            print(modo, line)
+            print(tabla)
+            print(sugerencia)
+            with open(os.path.join(outdir, modo + "_" + line + ".txt"), 'w') as ofile:
+                ofile.write(tabla + "\n" + sugerencia + "\n")
@@ -7,9 +7,14 @@ from scipy.interpolate import interp1d
 from math import cos, sin
 from matplotlib import cm
 import math
+from malla import MallaCilindrica, interpolate_temperature
+from planilla import leer_planilla
 from modulo_swelling import calculate_swelling
+from voxel_swelling import SwellingSurrogate, SwellingMemo, swelling_paralelo, swelling_deduplicado
 
-puntos = []
+
+#SALIDA DE RESULTADOS
+formato_salida = 'npy'      # 'npy' (binario, puntos.npy) o 'txt' (puntos.txt)
 
 #GEOMETRIA DE LA PIEZA
 r= 5
@@ -64,9 +69,8 @@ def get_data():
 
     f.close()
 
-    data = pd.read_excel('MOD-TB-DPA&HEvsT.xlsx', engine='openpyxl')
+    data = leer_planilla('MOD-TB-DPA&HEvsT.xlsx')          # cache binaria de la planilla (ver planilla.py)
     time = data['t'].tolist()
-    data = data.set_index('t')
     material = '347-1'
     dpa = np.array(data[material + ' dpa'])
     he = np.array(data[material + ' He [appm]'])
@@ -77,107 +81,77 @@ def get_data():
 parametros = get_data()
 app = 56.25
 
+#CALCULO DEL SWELLING DE CADA PUNTO
+#   'puntos': calculate_swelling en cada punto (exacto). Admite memoizacion, calculo en paralelo y deduplicacion (ver abajo).
+#   'superficie': se calcula el swelling en una grilla (T x atenuacion) y cada punto interpola bilinealmente en ella.
+#                 Mucho mas rapido, pero la grilla (~8 C con 46 puntos) suaviza los picos angostos de la curva (por ejemplo
+#                 entre 540 y 560 C). La memoizacion, el calculo en paralelo y la deduplicacion no se usan en este modo.
+modo_swelling = 'puntos'
+resolucion_superficie = (46, 11)        # (puntos en temperatura, puntos en atenuacion)
+verificar_superficie = True             # informa el error de interpolacion de la superficie ((nT-1)*(nA-1) evaluaciones extra)
 
-class Punto:
-    global r,h,reference_curves, paso_altura, paso_radial, paso_angular, radios
+superficie = None
+if modo_swelling == 'superficie':
+    T_min = min(min(curva[2].y) for curva in reference_curves)
+    T_max = max(max(curva[2].y) for curva in reference_curves)
+    superficie = SwellingSurrogate(calculate_swelling, app, parametros, T=(T_min, T_max, resolucion_superficie[0]), atenuacion=(0, 1, resolucion_superficie[1]))
+    if verificar_superficie:
+        print('error de interpolacion de la superficie de swelling: ', superficie.error())
 
-    def __init__(self, x, y, z, r, phi) -> None:
-        
-        self.x = x
-        self.y = y 
-        self.z = z 
-        self.r = r
-        self.indice_en_radios = radios.index(self.r)
+#MEMOIZACION DEL SWELLING POR PUNTO (solo modo_swelling = 'puntos'): clave (atenuacion, T), T redondeada solo si tolerancia_T > 0, cache LRU
+usar_memo = True
+tolerancia_T = 0.0                      # grados C, 0: sin redondeo (exacto); > 0 cuantiza T y suaviza los picos de la curva
+memo_maxsize = 100000
 
-        self.rho = (x**2 + y**2 + z**2)**(1/2)
-        self.phi = phi
-        self.T = self.interpolate_temperature()
+swelling_punto = SwellingMemo(calculate_swelling, tolerancia_T=tolerancia_T, maxsize=memo_maxsize) if usar_memo else calculate_swelling
 
-        self.area = math.radians(360/paso_angular)/2 * (radios[self.indice_en_radios]**2 - radios[self.indice_en_radios-1]**2)
-        self.h = (h/paso_altura)
-        self.vol = self.h*self.area
+#CALCULO EN PARALELO DEL SWELLING POR PUNTO (solo modo_swelling = 'puntos'): bloques de voxels en un pool de procesos con memoria compartida
+procesos_swelling = 1                   # 1: secuencial, None: cpu_count()
+voxels_por_tarea = 1000
 
-        #calculo de swelling para teol=56.25 y atenuacion = 0 (sin tener en cuenta el efecto de la atenuacion del danio en la penetracion)
-        #self.vol_after = self.swelling()
+#DEDUPLICACION (solo modo_swelling = 'puntos'): se evalua una vez por cada par (atenuacion, T) distinto y se copia a los voxels equivalentes
+deduplicar = True
+tolerancia_dedup = 0.0                  # grados C, 0: solo temperaturas identicas
 
-        #swelling teniendo en cuenta la penetracion neutronica
-        self.atenuacion = self.calculate_attenuation()
-        self.vol_after2 = self.vol * (1 + calculate_swelling(app, self.atenuacion, self.T, parametros))
 
-    #Calcular la temperatura interpolando las 4 curvas mas cercanas, utilizando el metodo de interpolacion bilineal
-    def interpolate_temperature(self):
-            # Verificar si el punto coincide con alguno de los puntos de referencia
-        for curva in reference_curves:
-            if (self.x, self.y) == (curva[0], curva[1]):
-                return curva[2](self.z)
+def calculate_attenuation(malla):
+    #calcula la atenuacion del dpa en base a la curva de penetracion (solo depende del radio del anillo)
 
-            # Calcular la distancia desde el punto intermedio (x, y) a cada uno de los puntos de referencia
-            distances = [math.sqrt((self.x - curva[0])**2 + (self.y - curva[1])**2) for curva in reference_curves]
+    return (1 - malla['r']/r)
 
-            # Realizar la interpolación ponderada
-            t_interpolated = sum([curva[2](self.z) / distance for curva, distance in zip(reference_curves, distances)]) / sum([1 / distance for distance in distances])
-
-        return t_interpolated
-
-        # Ejemplo de puntos y temperaturas de referencia (tuplas: (x, y, t))
-    
-    def swelling(self):
-        
-        return self.vol * (1 + swelling(self.T)/100)
-        
-    def calculate_attenuation(self):
-        #calcula la atenuacion del dpa en base a la curva de penetracion
-
-        fuente_x = 0
-        fuente_y = 0
-        fuente_z = 0
-        d = ((self.x - fuente_x)**2 + (self.y - fuente_y)**2 + (self.z-fuente_z)**2)**0.5
-
-        return (1 - self.r/r)
-        
-    def __repr__(self) -> str:
-     
-        return (f'(x: {self.x}, y: {self.y}, z: {self.z}, phi: {self.phi}), r: {self.r}, h: {self.h}, indice: {self.indice_en_radios}\nArea: {self.area}, volumen: {self.vol}\n')
-    
 
-class GenDistribucion:
+class GenDistribucion(MallaCilindrica):
+    """
+    Particion del cilindro en volumenes (columnas de NumPy, ver malla.MallaCilindrica) con su temperatura y volumen final.
+    Iterar la distribucion devuelve vistas con los mismos atributos que tenia Punto (p.x, p.T, p.vol, ...).
+    """
 
     def __init__(self, radio, altura, pasos_angulares, pasos_radiales, pasos_altura) -> None:
 
-        self.radio = radio
-        self.altura = altura
-        self.paso_angular = pasos_angulares
-        self.paso_radial = pasos_radiales
-        self.paso_h = pasos_altura
+        super().__init__(radio, altura, pasos_angulares, pasos_radiales, pasos_altura)
 
-        self.construct_geometry()
-        
-
-    def construct_geometry(self):
-
-        #por cada paso en altura ...
-        for z in range(self.paso_h):
-            #por cada paso en el radio ...
-            for i in range(1,self.paso_radial+1):
-                rad = (i+1)*(self.radio/self.paso_radial)
-                #por cada paso de angulo ...
-                for j in range(self.paso_angular):
-
-                    delta_phi = 2*np.pi/self.paso_angular
-
-                    angulo_actual = delta_phi*(j+1)*180/np.pi
-                    
-
-                    x= rad*cos(delta_phi*(j+1))
-                    y= rad*sin(delta_phi*(j+1))
-                    h= z *(self.altura/self.paso_h)
+        #temperatura de cada punto: interpolacion de las curvas de referencia ponderada por la inversa de la distancia
+        self['T'] = interpolate_temperature(reference_curves, self['x'], self['y'], self['z'])
 
-                    r = i * self.radio/self.paso_radial
-
-
-                    p = Punto(x,y,h,r, angulo_actual)
+        #calculo de swelling para teol=56.25 y atenuacion = 0 (sin tener en cuenta el efecto de la atenuacion del danio en la penetracion)
+        #self['vol_after'] = self['vol'] * (1 + swelling(self['T'])/100)
 
-                    puntos.append(p) #if 180>angulo_actual>0 else None
+        #swelling teniendo en cuenta la penetracion neutronica
+        self['atenuacion'] = calculate_attenuation(self)
+        if superficie is not None:
+            self['vol_after2'] = self['vol'] * (1 + superficie(self['T'], self['atenuacion']))
+        else:
+            if procesos_swelling != 1:
+                evaluar = lambda aten, temp: swelling_paralelo(swelling_punto, app, aten, temp, parametros, procesos_swelling, voxels_por_tarea)
+            else:
+                evaluar = lambda aten, temp: np.array([swelling_punto(app, a, T, parametros) for a, T in zip(aten, temp)])
+
+            if deduplicar:
+                sw, dedup = swelling_deduplicado(evaluar, self['atenuacion'], self['T'], tolerancia_dedup)
+                print('deduplicacion: {} voxels, {} evaluaciones (ratio {:.2f})'.format(dedup['voxels'], dedup['grupos'], dedup['ratio']))
+            else:
+                sw = evaluar(self['atenuacion'], self['T'])
+            self['vol_after2'] = self['vol'] * (1 + sw)
 
 
 def plot_3d_points(puntos):
@@ -247,27 +221,37 @@ def plot_3d_points_with_temperature(points):
 
 
 
-distribucion = GenDistribucion(radio= r, altura= h, pasos_angulares=paso_angular, pasos_radiales=paso_radial, pasos_altura=paso_altura)
+# protegido para poder usar procesos_swelling en sistemas sin fork (Windows)
+if __name__ == '__main__':
+    distribucion = GenDistribucion(radio= r, altura= h, pasos_angulares=paso_angular, pasos_radiales=paso_radial, pasos_altura=paso_altura)
+    puntos = distribucion       # iterable de puntos, para las funciones de graficacion
+
+    #plt.figure(figsize=(12,12))
 
-#plt.figure(figsize=(12,12))
+    #plot_3d_points(puntos)
+    #plot_3d_points_with_temperature(puntos)
 
-#plot_3d_points(puntos)
-#plot_3d_points_with_temperature(puntos)
+    #plt.show()
 
-#plt.show()
+    vol_cilindro = np.pi*(r**2)*h
+    vol_calculado = distribucion['vol'].sum()
+    error = abs((vol_cilindro - vol_calculado)/vol_cilindro)*100
 
-vol_cilindro = np.pi*(r**2)*h
-vol_calculado = sum([p.vol for p in puntos])
-error = abs((vol_cilindro - vol_calculado)/vol_cilindro)*100
+    vol_after_swelling = distribucion['vol_after2'].sum()
 
-vol_after_swelling = sum([p.vol_after2 for p in puntos])
+    print('volumen real del cilindro: ', vol_cilindro)
+    print('volumen calculado: ', vol_calculado)
+    print('error en el calculo del volumen (%): ', error)
+    print('volumen con swelling: ', vol_after_swelling)
+    print('aumento de volumen total (%): ', ((vol_after_swelling/vol_cilindro) -1)*100)
 
-print('volumen real del cilindro: ', vol_cilindro)
-print('volumen calculado: ', vol_calculado)
-print('error en el calculo del volumen (%): ', error)
-print('volumen con swelling: ', vol_after_swelling)
-print('aumento de volumen total (%): ', ((vol_after_swelling/vol_cilindro) -1)*100)
+    if superficie is None and usar_memo and procesos_swelling == 1:
+        print('memoizacion del swelling por punto: ', swelling_punto.estadisticas())
 
-with open('puntos.txt', 'a') as p:
-    for punto in puntos:
-        p.write(f'{punto.x}, {punto.y}, {punto.z}, {punto.T}, {punto.vol}, {punto.vol_after2}')
+    #SALIDA: 'npy' guarda las columnas en binario (puntos.npy, se lee con malla.leer_puntos), 'txt' agrega una linea por punto a puntos.txt
+    if formato_salida == 'npy':
+        distribucion.guardar('puntos.npy', ("x", "y", "z", "T", "vol", "vol_after2"))
+    else:
+        with open('puntos.txt', 'a') as p:
+            for punto in puntos:
+                p.write(f'{punto.x}, {punto.y}, {punto.z}, {punto.T}, {punto.vol}, {punto.vol_after2}')
@@ -0,0 +1,346 @@
+"""
+Malla cilindrica de la pieza guardada como columnas de NumPy (una fila por volumen discreto).
+
+Reemplaza la lista de objetos Punto de gradtemp2.py y GradPorCurvasZ.py: la geometria se genera con
+broadcasting y cada magnitud (x, y, z, r, phi, vol, T, vol_after, ...) es un array. Para el codigo que
+recorre los puntos uno por uno, iterar la malla devuelve vistas PuntoMalla con los mismos atributos que Punto.
+
+"""
+
+import math
+
+import numpy as np
+
+
+def interpolate_temperature(reference_curves, x, y, z) -> np.ndarray:
+    """
+    Temperatura de todos los puntos (x, y, z) interpolando las curvas de referencia [(xc, yc, T(z)), ...]
+    con pesos 1/distancia en el plano (x, y).
+
+    Cada curva se evalua una sola vez sobre las alturas distintas de la malla. Los puntos que coinciden
+    exactamente con una curva toman el valor de esa curva (la primera, si coinciden varias).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    niveles, inversa = np.unique(np.asarray(z, dtype=float), return_inverse=True)
+    inversa = inversa.reshape(x.shape)
+
+    num = np.zeros(x.shape)
+    den = np.zeros(x.shape)
+    T = np.full(x.shape, np.nan)
+    for xc, yc, curva in reference_curves:
+        Tc = np.asarray(curva(niveles), dtype=float)[inversa]
+        d = np.sqrt((x - xc)**2 + (y - yc)**2)
+        exacto = (d == 0) & np.isnan(T)
+        T[exacto] = Tc[exacto]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            num += Tc / d
+            den += 1 / d
+
+    pendientes = np.isnan(T)
+    T[pendientes] = num[pendientes] / den[pendientes]
+    return T
+
+
+class PuntoMalla:
+
+    """ Vista de un volumen de la malla, con los atributos de Punto (p.x, p.T, p.vol, ...) leidos de las columnas. """
+
+    __slots__ = ("malla", "i")
+
+    def __init__(self, malla, i: int) -> None:
+        self.malla = malla
+        self.i = i
+
+    def __getattr__(self, nombre: str):
+        try:
+            return self.malla.columnas[nombre][self.i]
+        except KeyError:
+            raise AttributeError(nombre) from None
+
+    def __repr__(self) -> str:
+        return (f'(x: {self.x}, y: {self.y}, z: {self.z}, phi: {self.phi}), r: {self.r}, h: {self.h}, indice: {self.indice_en_radios}\nArea: {self.area}, volumen: {self.vol}\n')
+
+
+class MallaCilindrica:
+
+    """
+    Genera la particion de un cilindro en volumenes discretos, con la misma numeracion que el triple ciclo
+    (altura, radio, angulo) de GenDistribucion.construct_geometry.
+
+        radio, altura: dimensiones de la pieza.
+
+        pasos_angulares, pasos_radiales, pasos_altura: cantidad de divisiones en cada direccion.
+
+        capas: (desde, hasta) genera solo esas capas de altura (un bloque de la malla completa), None genera todas.
+
+    Columnas: x, y, z, r, phi, rho, indice_en_radios, h, area, vol, y T / vol_after (NaN hasta que se calculan).
+    """
+
+    def __init__(self, radio, altura, pasos_angulares, pasos_radiales, pasos_altura, capas: tuple = None) -> None:
+
+        self.radio = radio
+        self.altura = altura
+        self.paso_angular = pasos_angulares
+        self.paso_radial = pasos_radiales
+        self.paso_h = pasos_altura
+        self.capas = capas if capas is not None else (0, pasos_altura)
+        self.radios = np.arange(pasos_radiales + 1) * (radio / pasos_radiales)
+
+        self.columnas = {}
+        self.construct_geometry()
+
+
+    def construct_geometry(self) -> None:
+
+        # indices (altura, radio, angulo) en el mismo orden que el triple ciclo original
+        kz, ki, kj = np.meshgrid(np.arange(*self.capas), np.arange(1, self.paso_radial + 1), np.arange(self.paso_angular), indexing='ij', sparse=True)
+        forma = (self.capas[1] - self.capas[0], self.paso_radial, self.paso_angular)
+
+        delta_phi = 2*np.pi/self.paso_angular
+        rad = (ki + 1)*(self.radio/self.paso_radial)            # radio donde se ubica el punto (como en el codigo original)
+
+        x = rad*np.cos(delta_phi*(kj + 1))
+        y = rad*np.sin(delta_phi*(kj + 1))
+        z = kz*(self.altura/self.paso_h)
+        r = ki*self.radio/self.paso_radial                      # radio exterior del anillo
+
+        area = math.radians(360/self.paso_angular)/2 * (self.radios[ki]**2 - self.radios[ki - 1]**2)
+        h = self.altura/self.paso_h
+
+        columnas = self.columnas
+        columnas["x"] = np.broadcast_to(x, forma).ravel()
+        columnas["y"] = np.broadcast_to(y, forma).ravel()
+        columnas["z"] = np.broadcast_to(z, forma).astype(float).ravel()
+        columnas["r"] = np.broadcast_to(r, forma).ravel()
+        columnas["indice_en_radios"] = np.broadcast_to(ki, forma).ravel()
+        columnas["phi"] = np.broadcast_to(delta_phi*(kj + 1)*180/np.pi, forma).ravel()
+        columnas["rho"] = (columnas["x"]**2 + columnas["y"]**2 + columnas["z"]**2)**(1/2)
+        columnas["area"] = np.broadcast_to(area, forma).ravel()
+        columnas["h"] = np.full(len(columnas["x"]), h)
+        columnas["vol"] = columnas["h"]*columnas["area"]
+        columnas["T"] = np.full(len(columnas["x"]), np.nan)
+        columnas["vol_after"] = np.full(len(columnas["x"]), np.nan)
+
+        return None
+
+
+    def __len__(self) -> int:
+        return len(self.columnas["x"])
+
+    def __getitem__(self, nombre: str) -> np.ndarray:
+        return self.columnas[nombre]
+
+    def __setitem__(self, nombre: str, valores) -> None:
+        self.columnas[nombre] = np.asarray(valores, dtype=float)
+
+    def __iter__(self):
+        return (PuntoMalla(self, i) for i in range(len(self)))
+
+    def punto(self, i: int) -> PuntoMalla:
+        return PuntoMalla(self, i)
+
+
+    def guardar(self, ruta: str, nombres: tuple = ("x", "y", "z", "T", "vol", "vol_after")) -> None:
+        """
+        Guarda las columnas pedidas en un unico archivo .npy (array estructurado, un campo por columna)
+        escrito de una sola vez. Se lee sin cargarlo en memoria con leer_puntos(ruta).
+        """
+        datos = np.empty(len(self), dtype=[(nombre, self.columnas[nombre].dtype) for nombre in nombres])
+        for nombre in nombres:
+            datos[nombre] = self.columnas[nombre]
+        np.save(ruta, datos)
+        return None
+
+
+class MallaAdaptativa(MallaCilindrica):
+
+    """
+    Particion adaptativa del cilindro: parte de una malla gruesa de sectores anulares y divide en 8 (radio, angulo y altura
+    a la mitad) cada celda donde el campo (temperatura o swelling) se aparta de una variacion trilineal mas que la tolerancia
+    (ver residuo). Las celdas hijas cubren exactamente a la madre, por lo que el volumen total se conserva.
+
+        radio, altura: dimensiones de la pieza.
+
+        pasos_angulares, pasos_radiales, pasos_altura: divisiones de la malla gruesa inicial.
+
+        campo: funcion vectorizada (x, y, z) -> valor usada como criterio (por ejemplo la temperatura interpolada).
+
+        tolerancia: residuo maximo admitido en una celda (en unidades del campo).
+
+        niveles: cantidad maxima de divisiones sucesivas.
+
+    Tiene las mismas columnas que MallaCilindrica (el punto de cada celda es su centro) y T = campo en el centro;
+    ademas r_in, r_out, phi_in, phi_out (radianes), z_in, z_out y nivel.
+    """
+
+    def __init__(self, radio, altura, pasos_angulares, pasos_radiales, pasos_altura, campo, tolerancia: float, niveles: int = 4) -> None:
+
+        self.campo = campo
+        self.tolerancia = tolerancia
+        self.niveles = niveles
+        super().__init__(radio, altura, pasos_angulares, pasos_radiales, pasos_altura)
+
+
+    def construct_geometry(self) -> None:
+
+        kz, ki, kj = [k.ravel() for k in np.meshgrid(np.arange(self.paso_h), np.arange(self.paso_radial), np.arange(self.paso_angular), indexing='ij')]
+        celdas = {
+            "r_in": self.radios[ki], "r_out": self.radios[ki + 1],
+            "phi_in": kj*(2*np.pi/self.paso_angular), "phi_out": (kj + 1)*(2*np.pi/self.paso_angular),
+            "z_in": kz*(self.altura/self.paso_h), "z_out": (kz + 1)*(self.altura/self.paso_h),
+            "nivel": np.zeros(len(kz), dtype=int),
+        }
+
+        terminadas = []
+        for nivel in range(self.niveles):
+            dividir = self.residuo(celdas) > self.tolerancia
+            terminadas.append({k: v[~dividir] for k, v in celdas.items()})
+            if not dividir.any():
+                celdas = None
+                break
+            celdas = MallaAdaptativa.dividir({k: v[dividir] for k, v in celdas.items()})
+        if celdas is not None:
+            terminadas.append(celdas)
+
+        columnas = self.columnas
+        for k in terminadas[0]:
+            columnas[k] = np.concatenate([c[k] for c in terminadas])
+
+        rm = (columnas["r_in"] + columnas["r_out"])/2
+        pm = (columnas["phi_in"] + columnas["phi_out"])/2
+        dphi = columnas["phi_out"] - columnas["phi_in"]
+
+        columnas["x"] = rm*np.cos(pm)
+        columnas["y"] = rm*np.sin(pm)
+        columnas["z"] = (columnas["z_in"] + columnas["z_out"])/2
+        columnas["r"] = columnas["r_out"]
+        columnas["indice_en_radios"] = np.searchsorted(self.radios, columnas["r_out"])
+        columnas["phi"] = pm*180/np.pi
+        columnas["rho"] = (columnas["x"]**2 + columnas["y"]**2 + columnas["z"]**2)**(1/2)
+        columnas["area"] = dphi/2 * (columnas["r_out"]**2 - columnas["r_in"]**2)
+        columnas["h"] = columnas["z_out"] - columnas["z_in"]
+        columnas["vol"] = columnas["h"]*columnas["area"]
+        columnas["T"] = np.asarray(self.campo(columnas["x"], columnas["y"], columnas["z"]), dtype=float)
+        columnas["vol_after"] = np.full(len(columnas["x"]), np.nan)
+
+        return None
+
+
+    def residuo(self, celdas: dict) -> np.ndarray:
+        """
+        Error de interpolacion trilineal de cada celda: |campo en el centro - promedio del campo en los 8 vertices|.
+        Es cero si el campo varia linealmente en radio, angulo y altura, por lo que un gradiente uniforme no se refina.
+        """
+        r = np.stack([celdas["r_in"], celdas["r_out"]])
+        p = np.stack([celdas["phi_in"], celdas["phi_out"]])
+        z = np.stack([celdas["z_in"], celdas["z_out"]])
+
+        puntos = [(r[a], p[b], z[c]) for a in (0, 1) for b in (0, 1) for c in (0, 1)]
+        puntos.append((r.mean(axis=0), p.mean(axis=0), z.mean(axis=0)))
+        rr = np.concatenate([i[0] for i in puntos])
+        pp = np.concatenate([i[1] for i in puntos])
+        zz = np.concatenate([i[2] for i in puntos])
+
+        valores = np.asarray(self.campo(rr*np.cos(pp), rr*np.sin(pp), zz), dtype=float).reshape(len(puntos), -1)
+        return np.abs(valores[-1] - valores[:-1].mean(axis=0))
+
+
+    @staticmethod
+    def dividir(celdas: dict) -> dict:
+        """ Divide cada celda en 8 (mitad en radio, angulo y altura). """
+        hijas = {k: [] for k in celdas}
+        for a in (0, 1):
+            for b in (0, 1):
+                for c in (0, 1):
+                    for eje, sel in (("r", a), ("phi", b), ("z", c)):
+                        medio = (celdas[eje + "_in"] + celdas[eje + "_out"])/2
+                        hijas[eje + "_in"].append(medio if sel else celdas[eje + "_in"])
+                        hijas[eje + "_out"].append(celdas[eje + "_out"] if sel else medio)
+                    hijas["nivel"].append(celdas["nivel"] + 1)
+        return {k: np.concatenate(v) for k, v in hijas.items()}
+
+
+class Resumen:
+
+    """
+    Reducciones acumuladas bloque a bloque: cantidad de puntos, volumen total, volumen con swelling,
+    minimo / maximo de temperatura y de swelling (%) e histograma de temperatura.
+
+        bins: bordes del histograma de temperatura.
+
+        columna_after: columna con el volumen final (vol_after o vol_after2).
+    """
+
+    def __init__(self, bins, columna_after: str = "vol_after") -> None:
+        self.columna_after = columna_after
+        self.bins = np.asarray(bins, dtype=float)
+        self.histograma = np.zeros(len(self.bins) - 1, dtype=int)
+        self.n = 0
+        self.vol = 0.0
+        self.vol_after = 0.0
+        self.T_min = np.inf
+        self.T_max = -np.inf
+        self.swelling_min = np.inf
+        self.swelling_max = -np.inf
+
+
+    def agregar(self, malla) -> None:
+        """ Suma un bloque de la malla a las reducciones. """
+        vol = malla["vol"]
+        after = malla[self.columna_after]
+        sw = (after/vol - 1)*100
+
+        self.n += len(malla)
+        self.vol += vol.sum()
+        self.vol_after += after.sum()
+        self.T_min = min(self.T_min, malla["T"].min())
+        self.T_max = max(self.T_max, malla["T"].max())
+        self.swelling_min = min(self.swelling_min, sw.min())
+        self.swelling_max = max(self.swelling_max, sw.max())
+        self.histograma += np.histogram(malla["T"], bins=self.bins)[0]
+        return None
+
+
+def procesar_por_bloques(crear, pasos_altura: int, capas_por_bloque: int, resumen: Resumen, ruta: str = None,
+                         nombres: tuple = ("x", "y", "z", "T", "vol", "vol_after"), escribir_bloque = None) -> Resumen:
+    """
+    Recorre la malla por bloques de capas_por_bloque capas de altura, sin tener nunca la malla completa en memoria.
+
+        crear: funcion (desde, hasta) -> malla del bloque con T y el volumen final ya calculados
+               (por ejemplo GenDistribucion(..., capas=(desde, hasta))).
+
+        resumen: Resumen donde se acumulan las reducciones.
+
+        ruta: si se indica, las columnas nombres se escriben en un .npy (mismo formato que MallaCilindrica.guardar)
+              que se va llenando bloque a bloque a traves de un memmap.
+
+        escribir_bloque: funcion opcional llamada con cada bloque (por ejemplo para agregar lineas a un .txt).
+    """
+    salida = None
+    inicio = 0
+    for desde in range(0, pasos_altura, capas_por_bloque):
+        bloque = crear(desde, min(desde + capas_por_bloque, pasos_altura))
+
+        if ruta is not None:
+            if salida is None:
+                total = len(bloque) * pasos_altura // (bloque.capas[1] - bloque.capas[0])
+                salida = np.lib.format.open_memmap(ruta, mode='w+', shape=(total,),
+                                                   dtype=[(nombre, bloque[nombre].dtype) for nombre in nombres])
+            for nombre in nombres:
+                salida[nombre][inicio:inicio + len(bloque)] = bloque[nombre]
+        if escribir_bloque is not None:
+            escribir_bloque(bloque)
+
+        resumen.agregar(bloque)
+        inicio += len(bloque)
+
+    if salida is not None:
+        salida.flush()
+        del salida
+    return resumen
+
+
+def leer_puntos(ruta: str) -> np.memmap:
+    """ Abre un archivo escrito por MallaCilindrica.guardar como memmap (solo lectura): datos['T'], datos['vol'], ... """
+    return np.load(ruta, mmap_mode='r')
@@ -0,0 +1,69 @@
+"""
+Lectura de la planilla de dpa y helio (MOD-TB-DPA&HEvsT.xlsx) con cache binaria.
+
+La primera lectura parsea el .xlsx con pandas/openpyxl y guarda las columnas en un .npz al lado de la planilla;
+las siguientes leen el .npz directamente. La cache se invalida si cambia la planilla (fecha de modificacion y
+tamanio, y si esos difieren se compara el hash del contenido).
+
+"""
+
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+
+
+def hash_archivo(ruta: str) -> str:
+    """ sha256 del contenido de un archivo. """
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(2**20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def ruta_cache(ruta: str) -> str:
+    return ruta + ".cache.npz"
+
+
+def guardar_cache(ruta: str, columnas: dict, sha: str) -> None:
+    """ Guarda las columnas y la identificacion de la planilla (mtime, tamanio, hash) en el .npz, escritura atomica. """
+    st = os.stat(ruta)
+    nombres = list(columnas)
+    arrays = {"c{}".format(i): columnas[n] for i, n in enumerate(nombres)}
+    tmp = ruta_cache(ruta) + ".{}.tmp".format(os.getpid())
+    with open(tmp, 'wb') as ofile:
+        np.savez(ofile, _columnas=np.array(nombres), _mtime=st.st_mtime_ns, _tamanio=st.st_size, _sha256=sha, **arrays)
+    os.replace(tmp, ruta_cache(ruta))
+    return None
+
+
+def leer_planilla(ruta: str = 'MOD-TB-DPA&HEvsT.xlsx') -> dict:
+    """
+    Devuelve {nombre de columna: np.ndarray} con las columnas de la primera hoja de la planilla
+    (por ejemplo 't', '347-1 dpa', '347-1 He [appm]').
+    """
+    st = os.stat(ruta)
+    sha = None
+    try:
+        with np.load(ruta_cache(ruta)) as data:
+            nombres = [str(n) for n in data["_columnas"]]
+            vigente = int(data["_mtime"]) == st.st_mtime_ns and int(data["_tamanio"]) == st.st_size
+            if not vigente:
+                sha = hash_archivo(ruta)
+                vigente = str(data["_sha256"]) == sha
+            if vigente:
+                columnas = {n: data["c{}".format(i)] for i, n in enumerate(nombres)}
+                if int(data["_mtime"]) != st.st_mtime_ns:
+                    guardar_cache(ruta, columnas, sha)        # mismo contenido con otra fecha (por ejemplo una copia)
+                return columnas
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        pass               # cache inexistente, vieja o danada: se vuelve a leer la planilla
+
+    import pandas as pd
+    data = pd.read_excel(ruta, engine='openpyxl')
+    columnas = {str(n): data[n].to_numpy() for n in data.columns}
+    columnas = {n: (c.astype(str) if c.dtype == object else c) for n, c in columnas.items()}
+    guardar_cache(ruta, columnas, sha or hash_archivo(ruta))
+    return columnas
@@ -1,41 +1,261 @@
+"""
+Barrido de temperaturas (200 - 650 C) de cada ajuste de datos.txt con swelling.CavitySwelling.
+
+Motor de calculo: swelling.py. Hasta el cambio a run_batch se usaba Swelling_atucha_Voids.py, que es otro modelo
+(energia de emision de vacancias C4 = efv * 1.6E-19 en lugar de (efv - 0.1) * 1.6E-19, entre otras diferencias), por lo que
+las curvas no son comparables con las anteriores: para el Titulo 1 (fi = 0.01) el swelling de fin de vida pasa de 47.5 %
+a 27.6 % a 500 C y de 54.6 % a 5.5 % a 600 C; por debajo de ~400 C la diferencia es menor al 1 %.
+
+"""
+
 from timeit import default_timer as timer
 from multiprocessing import Pool, cpu_count, freeze_support
-from itertools import repeat
-from Swelling_atucha_Voids import *
+import queue
+from swelling import *
+from swelling_cache import ResultCache
+
+procesos = None     # cantidad de procesos del pool (None -> cpu_count())
+usarCache = True    # False recalcula todos los puntos sin leer ni escribir la cache en disco
+buscarPico = False  # True solo busca la temperatura de maximo swelling de cada ajuste (ver findPeak)
+toleranciaPico = 0.5    # grados C
+muestreoAdaptativo = False  # True elige las temperaturas de cada curva segun el error de interpolacion (ver adaptiveCurves)
+presupuestoCurva = 46   # temperaturas maximas por curva
+toleranciaCurva = 0.5   # error de interpolacion admitido (% de swelling)
+
+cache = ResultCache(activo=usarCache)
 
 res = {}
 def fun_(t, he, dpa, initialFraction, fmd_rate, omega, se, efv, rM, r, e, fr, teol, N0):
     cs = CavitySwelling(he, dpa, z = t + 273, fi = initialFraction, uf= fmd_rate,
                         omega=omega, s=se, efv=efv, rM=rM, r=r, e=e, f=fr, teol=teol, _N0=N0)
-    b = cs.run(silent=False)
-    return t, b[1][100]*100, cs.rho1(t + 273), cs.deol
+    key = cache.clave(he, dpa, t + 273, fmd_rate, omega, se, efv, rM, r, e, fr, teol, N0, initialFraction)
+    hit = cache.get(key)
+    if hit is not None:
+        AGBS, deol, err = hit
+        if err is not None:
+            return t, None, cs.rho1(t + 273), None, err
+        return t, AGBS[cs.pasos]*100, cs.rho1(t + 273), deol, None
+    try:
+        cs.run(silent=False)
+    except Exception as ex:
+        # el error se devuelve por temperatura, process decide si reintenta con otra fraccion inicial
+        cache.put(key, [], None, str(ex))
+        return t, None, cs.rho1(t + 273), None, str(ex)
+    cache.put(key, cs.AGBS, cs.deol)
+    return t, cs.AGBS[cs.pasos]*100, cs.rho1(t + 273), cs.deol, None
 
 def add(future):
     pass
 
-def process(he, dpa, title, fi, fmd_rate, omega, se, efv, rM, r, e, fr, teol, N0):
-    gbVal =  [i for i in range(200, 660, 10)]
-    pool = Pool(processes=8)
-    res = pool.starmap(fun_, zip(gbVal, repeat(he), repeat(dpa), repeat(fi), repeat(fmd_rate), repeat(omega), repeat(se), repeat(efv), repeat(rM), repeat(r), repeat(e),  repeat(fr),  repeat(teol),  repeat(N0)))
-    pool.terminate()
-    t = []; s = []; deol = []; rho1 = []
-    for i in res:
-        t.append(i[0])
-        s.append(i[1])
-        rho1.append(i[2])
-        deol.append(i[3])
+def writeFit(title, fi, res, temps):
+    """
+    Escribe la tabla (.txt) y el grafico (.png) de un ajuste. res: {t: (resultado de fun_, fraccion inicial)}.
+    fi es la fraccion inicial de partida; la de cada temperatura (puede ser mayor si se reintento) va en la columna fi.
+    """
+    t = []; s = []; deol = []; rho1 = []; fis = []
+    for i in temps:
+        row, fiT = res[i]
+        if row[4] is not None:
+            print("{} {}C: {}".format(title, i, row[4]))
+            continue
+        t.append(row[0])
+        s.append(row[1])
+        rho1.append(row[2])
+        deol.append(row[3])
+        fis.append(fiT)
 
     import tabulate
-    print(tabulate.tabulate(CavitySwelling.transpose([t,s,rho1,deol]), headers=["C", "%", "rho1","Deol"]))
+    print(tabulate.tabulate(CavitySwelling.transpose([t,s,rho1,deol,fis]), headers=["C", "%", "rho1","Deol","fi"]))
     import matplotlib.pyplot as plt
     plt.clf() 
     plt.plot(t, s, marker='.', linestyle='None')
     plt.savefig(title + ".png")
     with open(title + ".txt", 'w') as ofile:
-        ofile.write("Fraccion inincial = {:0.3f}\n".format(fi))
-        ofile.write(tabulate.tabulate(CavitySwelling.transpose([t,s,rho1,deol]), headers=["C", "%", "rho1","Deol"]))
+        ofile.write("Fraccion inicial de partida = {:0.3f} (la usada en cada temperatura esta en la columna fi)\n".format(fi))
+        ofile.write(tabulate.tabulate(CavitySwelling.transpose([t,s,rho1,deol,fis]), headers=["C", "%", "rho1","Deol","fi"]))
         ofile.flush()
 
+def retryFi(fi, fiMax = 0.1, step = 0.001):
+    """
+    Politica de reintento de la fraccion inicial, comun a schedule y runWithRetry. Generador: produce la proxima fraccion
+    inicial a probar y recibe (send) True si el calculo termino con ella. Prueba fi; si falla, la mayor fi + k * step (< fiMax)
+    y, si esa termina, busca por biseccion la menor fi + k * step con la que el calculo termina. Se agota cuando no hay mas que probar.
+    """
+    kMax = int(round((fiMax - fi) / step)) - 1
+    fiOf = lambda k: round(fi + k * step, 6)
+    if (yield fi):
+        return
+    if not (yield fiOf(kMax)):
+        return
+    lo, hi = 0, kMax
+    while hi - lo > 1:
+        k = (lo + hi) // 2
+        if (yield fiOf(k)):
+            hi = k
+        else:
+            lo = k
+
+def schedule(pool, fits, fi, fiMax = 0.1, step = 0.001, temps = None, tempsByFit = None, write = True):
+    """
+    Corre todos los pares (ajuste, temperatura) en una unica cola de tareas del pool, empezando por las temperaturas altas
+    (las mas lentas y las que suelen fallar), y escribe las salidas de cada ajuste apenas terminan todas sus temperaturas.
+
+        fits: lista de (title, (he, dpa, fmd_rate, omega, se, efv, rM, r, e, fr, teol, N0)).
+
+        temps: temperaturas de todos los ajustes (por defecto 200 ... 650 C cada 10 C); tempsByFit: una lista por ajuste.
+
+        write: False no escribe las salidas, solo devuelve [{t: (resultado de fun_, fraccion inicial)} por ajuste].
+
+    Si una temperatura falla con la fraccion inicial fi, busca la menor fraccion inicial con la que el calculo termina (ver retryFi);
+    cada prueba es una tarea mas de la cola.
+    """
+    tempsByFit = tempsByFit or [list(temps or range(200, 660, 10)) for _ in fits]
+
+    done = queue.Queue()
+    def submit(n, t, fiT):
+        pool.apply_async(fun_, (t, *fits[n][1][:2], fiT, *fits[n][1][2:]),
+                         callback=lambda row: done.put((n, fiT, row)), error_callback=lambda ex: done.put((n, fiT, ex)))
+
+    res = [{} for _ in fits]            # {t: (resultado de fun_, fraccion inicial)}
+    failed = [[] for _ in fits]         # temperaturas que fallaron con fi
+    retries = [{} for _ in fits]        # {t: generador de retryFi}
+    pending = [len(i) for i in tempsByFit]
+    start = [timer() for _ in fits]
+
+    for t, n in sorted(((t, n) for n in range(len(fits)) for t in tempsByFit[n]), key=lambda i: (-i[0], i[1])):
+        retries[n][t] = retryFi(fi, fiMax, step)
+        submit(n, t, next(retries[n][t]))
+
+    running = sum(pending)
+    while running:
+        n, fiT, row = done.get()
+        running -= 1
+        if isinstance(row, BaseException):
+            raise row
+        t = row[0]
+        if t not in res[n] and row[4] is not None:
+            failed[n].append(t)
+        if t not in res[n] or row[4] is None or res[n][t][0][4] is not None:
+            res[n][t] = (row, fiT)                      # la ultima corrida que termino (la menor fraccion), o la ultima falla
+        try:
+            submit(n, t, retries[n][t].send(row[4] is None)); running += 1
+            continue
+        except StopIteration:
+            del retries[n][t]
+
+        pending[n] -= 1
+        if pending[n] == 0 and write:
+            title = fits[n][0]
+            if failed[n]:
+                print("{} temperaturas fallaron con initialFraction {:0.3f}: {}".format(len(failed[n]), fi, sorted(failed[n])))
+            writeFit(title, fi, res[n], tempsByFit[n])
+            print(title, timer() - start[n])
+    return res
+
+def refine(res, available, tol, perRound = 8, minWidth = 2.5):
+    """
+    Elige nuevas temperaturas para una curva: estima el error de la interpolacion lineal en cada intervalo entre temperaturas
+    calculadas como h**2 / 8 * |s''| (s'' por diferencias divididas en los extremos del intervalo) y devuelve el punto medio de los
+    intervalos con mayor error estimado que superan tol, como maximo min(perRound, available) y sin bajar de minWidth grados C.
+    """
+    t = sorted(i for i in res if res[i][0][4] is None)
+    if len(t) < 3 or available <= 0:
+        return []
+    s = [res[i][0][1] for i in t]
+    slope = [(s[i + 1] - s[i]) / (t[i + 1] - t[i]) for i in range(len(t) - 1)]
+    curv = [0.0] + [2 * abs(slope[i] - slope[i - 1]) / (t[i + 1] - t[i - 1]) for i in range(1, len(t) - 1)] + [0.0]
+    curv[0], curv[-1] = curv[1], curv[-2]
+    err = [((t[i + 1] - t[i])**2 / 8 * max(curv[i], curv[i + 1]), i) for i in range(len(t) - 1)]
+    new = []
+    for e, i in sorted(err, reverse=True):
+        if e <= tol or len(new) == min(perRound, available):
+            break
+        mid = round((t[i] + t[i + 1]) / 2, 1)
+        if t[i + 1] - t[i] > minWidth and mid not in res:
+            new.append(mid)
+    return new
+
+def adaptiveCurves(pool, fits, fi, budget = 46, tol = 0.5, start = range(200, 660, 50), perRound = 8, minWidth = 2.5, fiMax = 0.1, step = 0.001):
+    """
+    Curvas de swelling vs T con temperaturas no uniformes: parte de la grilla start y, por rondas, agrega temperaturas donde la
+    interpolacion lineal tiene mayor error estimado (ver refine) hasta que el error es menor que tol, los intervalos miden minWidth grados C
+    o cada curva usa budget temperaturas.
+    Cada ronda corre en schedule las temperaturas nuevas de todos los ajustes. Escribe las mismas salidas (.txt, .png) que schedule.
+    """
+    res = [{} for _ in fits]
+    new = [list(start) for _ in fits]
+    while any(new):
+        for n, r in enumerate(schedule(pool, fits, fi, fiMax, step, tempsByFit=new, write=False)):
+            res[n].update(r)
+        new = [refine(res[n], budget - len(res[n]), tol, perRound, minWidth) for n in range(len(fits))]
+    for n, (title, args) in enumerate(fits):
+        writeFit(title, fi, res[n], sorted(res[n]))
+        print(title, "temperaturas calculadas:", len(res[n]))
+    return res
+
+def process(pool, he, dpa, title, fi, fmd_rate, omega, se, efv, rM, r, e, fr, teol, N0, fiMax = 0.1, step = 0.001):
+    """ Corre y escribe un solo ajuste (ver schedule). """
+    return schedule(pool, [(title, (he, dpa, fmd_rate, omega, se, efv, rM, r, e, fr, teol, N0))], fi, fiMax, step)[0]
+
+def runWithRetry(t, args, fi, fiMax = 0.1, step = 0.001):
+    """
+    fun_ para una temperatura con la misma busqueda de fraccion inicial que schedule (ver retryFi), en serie.
+    Devuelve (resultado de fun_, fraccion inicial usada, cantidad de corridas).
+    """
+    policy = retryFi(fi, fiMax, step)
+    fiT = next(policy)
+    out = None
+    runs = 0
+    while True:
+        row = fun_(t, *args[:2], fiT, *args[2:])
+        runs += 1
+        if out is None or row[4] is None or out[0][4] is not None:
+            out = (row, fiT)
+        try:
+            fiT = policy.send(row[4] is None)
+        except StopIteration:
+            return out[0], out[1], runs
+
+def findPeak(args, fi, tol = 0.5, coarse = range(200, 660, 50), fiMax = 0.1, step = 0.001):
+    """
+    Busca la temperatura de maximo swelling de fin de vida: evalua la grilla gruesa, toma el intervalo alrededor del mejor
+    punto y lo achica por seccion aurea hasta que mide menos de tol (grados C).
+
+        args: (he, dpa, fmd_rate, omega, se, efv, rM, r, e, fr, teol, N0).
+
+    Devuelve {'T', 'swelling', 'fi', 'corridas'}; T es None si fallan todas las temperaturas de la grilla gruesa.
+    """
+    values = {}
+    runs = 0
+    def value(t):
+        nonlocal runs
+        if t not in values:
+            row, fiT, n = runWithRetry(t, args, fi, fiMax, step)
+            runs += n
+            values[t] = (row[1] if row[4] is None else float('-inf'), fiT)
+        return values[t][0]
+
+    coarse = list(coarse)
+    best = max(range(len(coarse)), key=lambda i: value(coarse[i]))
+    if value(coarse[best]) == float('-inf'):
+        return {'T': None, 'swelling': None, 'fi': None, 'corridas': runs}
+    a = coarse[max(best - 1, 0)]
+    b = coarse[min(best + 1, len(coarse) - 1)]
+
+    g = (5**0.5 - 1) / 2
+    c = b - g * (b - a)
+    d = a + g * (b - a)
+    while b - a > tol:
+        if value(c) >= value(d):
+            b, d = d, c
+            c = b - g * (b - a)
+        else:
+            a, c = c, d
+            d = a + g * (b - a)
+
+    tPeak = max(values, key=lambda t: values[t][0])
+    return {'T': tPeak, 'swelling': values[tPeak][0], 'fi': values[tPeak][1], 'corridas': runs}
+
 def castAndFlip(strIn = "3 2 1 0"):
     return [float(i) for i in strIn.split()][::-1]
 
@@ -51,47 +271,44 @@ def readFloat(f):
 def readFit(f):
     return castAndFlip(readString(f))
 
+def readHeader(f):
+    """ Lee los parametros comunes del encabezado de datos.txt. Devuelve (modo, {argumento de CavitySwelling: valor}). """
+    nombres = ("omega", "s", "efv", "rM", "r", "e", "f", "teol", "_N0")
+    parametros = {n: readFloat(f) for n in nombres}
+    modo = readString(f)
+    parametros["uf"] = 0.108 if "X750" in modo else 0.107     #H347 def
+    return modo, parametros
+
 if __name__ == '__main__':
     freeze_support()
     outdir = "out_fiteos"
-    index = 0
     import os
     try:
         os.mkdir(outdir)
     except:
         pass
+    # un unico pool y una unica cola de tareas para todos los ajustes, temperaturas y reintentos de fraccion inicial
+    fits = []
     with open("datos.txt") as f:
-        omega = readFloat(f)
-        se = readFloat(f)
-        efv = readFloat(f)
-        rM = readFloat(f)
-        r = readFloat(f)
-        ee = readFloat(f)
-        fr = readFloat(f)
-        teol = readFloat(f)
-        N0 = readFloat(f)
-        modo = readString(f)
-        fmd_rate =0.107 #H347 def
-        if "X750" in modo:
-            fmd_rate = 0.108
+        modo, p = readHeader(f)
         while (line := readString(f)):
-            index += 1
-            start = timer()
             he = readFit(f)
             dpa = readFit(f)
-            fi = 0.01
-            runOk = False
-            while (not runOk and fi < 0.1):
-                try:
-                    process(he, dpa, os.path.join(outdir, modo + "_" + line), fi, fmd_rate, omega, se, efv, rM, r, ee, fr, teol, N0)
-                    runOk = True
-                except Exception as e:
-                    print("error ({}) en initialFraction {:0.3f} incrementando en 0.001".format(e, fi))
-                    fi += 0.001
-                    if fi >= 0.1:
-                        print(line+ "_" + modo + ":" +  str(e))
-                        print(he)
-                        print(dpa)
-            end = timer()
-            time = end - start
-            print(time)
+            fits.append((os.path.join(outdir, modo + "_" + line),
+                         (he, dpa, p["uf"], p["omega"], p["s"], p["efv"], p["rM"], p["r"], p["e"], p["f"], p["teol"], p["_N0"])))
+    fi = 0.01
+    start = timer()
+    with Pool(processes=procesos or cpu_count()) as pool:
+        if buscarPico:
+            peaks = pool.starmap(findPeak, [(args, fi, toleranciaPico) for title, args in fits])
+            import tabulate
+            table = tabulate.tabulate([[title, p['T'], p['swelling'], p['fi'], p['corridas']] for (title, args), p in zip(fits, peaks)],
+                                      headers=["ajuste", "T pico [C]", "%", "fi", "corridas"])
+            print(table)
+            with open(os.path.join(outdir, modo + "_picos.txt"), 'w') as ofile:
+                ofile.write(table)
+        elif muestreoAdaptativo:
+            adaptiveCurves(pool, fits, fi, presupuestoCurva, toleranciaCurva)
+        else:
+            schedule(pool, fits, fi)
+    print(timer() - start)
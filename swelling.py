@@ -8,6 +8,7 @@ Modificado por:
 
 """
 
+import copy
 from math import pi, exp, sqrt, log
 import tabulate
 import matplotlib.pyplot as plt
@@ -44,6 +45,22 @@ class CavitySwelling:
         _N0: densidad de dislocacion.
 
         fi: fraccion inicial (% de tiempo de vida inicial)
+
+        integracion_he: 'exacta' integra heTot con la primitiva del polinomio de Helio; 'rectangulo' conserva la suma de Riemann original (n=1000).
+
+        integrador: 'euler' (pasos fijos, el original) o 'adaptativo' (paso variable con control de error, ver integrarAdaptativo).
+
+        tolerancia, paso_min, paso_max: error relativo por paso y limites del paso (fraccion de tiempo de vida) del integrador adaptativo.
+
+        pasos: cantidad de pasos en el ciclo de vida. Los resultados se dan sobre la grilla t = i/pasos, i = 0 ... pasos + 1,
+               el fin de vida es el indice pasos (100 en la version original).
+
+        historia: (tiempo [anios], dpa, he [appm]) muestreados, por ejemplo las columnas de la planilla MOD-TB-DPA&HEvsT.xlsx.
+                  Si se da, dpa, he y sus tasas se interpolan de estas muestras (cubica monotona) en lugar de usar he_fit y dpa_fit,
+                  que pueden ser None. Las muestras deben cubrir el tiempo de vida [0, teol] (si no, ValueError).
+                  Con muestras anuales de los polinomios de datos.txt el swelling de fin de vida difiere ~1E-5 del calculo con los
+                  polinomios, pero cerca de 550 C y por encima de ~600 C el resultado es muy sensible a cualquier cambio en las curvas
+                  (Titulo 1 a 550 C: AGBS 0.0710 con muestras anuales contra 0.0102 con los polinomios).
         """
 
     # RR ????
@@ -52,7 +69,11 @@ class CavitySwelling:
             for i in range(800)]
 
 
-    def __init__(self, he_fit, dpa_fit, z, uf, omega = 1.14E-29, s = 1, efv = 1.6, rM = 5000, r = 380, e = 1.4, f = 1, teol = 56.25, _N0 = 6e14, fi = 0.01): 
+    # Columnas de self.resultados, cada una queda tambien como atributo (self.AGBS, self.YB, ...)
+    CAMPOS = ("AGBS", "YB", "PB", "CGB", "CJVS", "DPA", "HELIO", "RADIO", "SS")
+
+
+    def __init__(self, he_fit, dpa_fit, z, uf, omega = 1.14E-29, s = 1, efv = 1.6, rM = 5000, r = 380, e = 1.4, f = 1, teol = 56.25, _N0 = 6e14, fi = 0.01, integracion_he = 'exacta', integrador = 'euler', tolerancia = 1E-3, paso_min = 1E-4, paso_max = 0.1, pasos = 100, historia = None): 
         
         self.teol = teol                        # 56.25                         Time End-Of-Life
         self.Teol = teol * 365 * 24 * 3600      # 1.773.900.000                 Time End-Of-Life (seconds)
@@ -69,8 +90,24 @@ class CavitySwelling:
         self.f = f                              # 1                             Eficiencia de Cascada
         self.fi = fi                            # 0.01                          Fraccion Inicial
         self.N0 = _N0                           # 6e14                          Densidad de dislocaciones
-
-        self.rv = None                          # Tabulate Object with result values      
+        self.integracion_he = integracion_he    # 'exacta'                      Metodo de integracion de heTot ('exacta' o 'rectangulo')
+        self.integrador = integrador            # 'euler'                       Integrador de AGB ('euler' o 'adaptativo')
+        self.tolerancia = tolerancia            # 1E-3                          Error relativo admitido por paso (adaptativo)
+        self.paso_min = paso_min                # 1E-4                          Paso minimo (fraccion de tiempo de vida)
+        self.paso_max = paso_max                # 0.1                           Paso maximo (fraccion de tiempo de vida)
+        self.integracion = None                 # {'pasos', 'rechazados', 'evaluaciones'} de la ultima corrida
+        self.pasos = pasos                      # 100                           Pasos de tiempo en el ciclo de vida
+        self.historia = None                    # {'t', 'dpa', 'he'}            Muestras y pendientes de la historia tabulada
+        if historia is not None:
+            self.historia = CavitySwelling.prepararHistoria(*historia)
+            if self.historia['t'][0] > 0 or self.historia['t'][-1] < teol:
+                raise ValueError("la historia cubre [{:g}, {:g}] anios y debe cubrir el tiempo de vida [0, {:g}]".format(
+                    self.historia['t'][0], self.historia['t'][-1], teol))
+        self._heTot = {}                        # {f: [float]}                  heTot(f, i/pasos) precalculado sobre la grilla de run()
+        self.tablas = self.tabular(pasos + 2)   # {nombre: [float]}             dpa, rateDpa, he y rateHe sobre la grilla t = i/pasos
+
+        self._rv = None                         # Tabulate Object with result values (se genera al leer self.rv)
+        self.resultados = None                  # np.ndarray estructurado       Una columna por cada nombre de CAMPOS
         self.AGBS = []                          # Swelling
         self.YB = []                            # EOS Constante
         self.PB = []                            # Presion
@@ -79,12 +116,17 @@ class CavitySwelling:
         self.DPA = []                           # Displacement per atom
         self.HELIO = []                         # Helio
         self.RADIO = []                         # Cavity radius
+        self.SS = []                            # Sink strength de las cavidades
 
 
     def rateHe(self, t:float) -> float:                        # Tasa de crecimiento del Helio
         """ 
         Calcula la tasa de formacion de Helio para un determinado tiempo de vida derivando la curva de generacion de Helio.\n
         """
+
+        if self.historia is not None:
+            return self.interpolarHistoria('he', t, derivada=True)
+
         x = self.he_fit
         tot = 0
         for i in range(1, len(x)):
@@ -98,6 +140,9 @@ class CavitySwelling:
         Devuelve el Helio total generado en un determinado tiempo de vida.
         """
 
+        if self.historia is not None:
+            return self.interpolarHistoria('he', t)
+
         x = self.he_fit
         tot = 0
         for i in range(0, len(x)):
@@ -111,6 +156,9 @@ class CavitySwelling:
         Devuelve el DPA para un determinado tiempo de vida.
         """
 
+        if self.historia is not None:
+            return self.interpolarHistoria('dpa', t)
+
         x = self.dpa_fit
         tot = 0
         for i in range(0, len(x)):
@@ -123,6 +171,9 @@ class CavitySwelling:
         Calcula la tasa de crecimiento de DPA para un determinado tiempo de vida derivando la curva de DPA.\n
         """
 
+        if self.historia is not None:
+            return self.interpolarHistoria('dpa', t, derivada=True)
+
         x = self.dpa_fit    
         tot = 0
         for i in range(1, len(x)):
@@ -138,6 +189,108 @@ class CavitySwelling:
         return self.teol * t
 
 
+    def prepararHistoria(tiempo, dpa, he) -> dict:
+        """
+        Ordena las muestras de la historia tabulada y calcula las pendientes en cada muestra del interpolador cubico monotono
+        (PCHIP, Fritsch-Carlson), que no genera oscilaciones ni tasas negativas entre muestras crecientes.
+        Las muestras repetidas (mismo tiempo y mismos valores) se unen; tiempos repetidos con valores distintos son un error.
+        Devuelve {'t': tiempos, 'dpa': (valores, pendientes), 'he': (valores, pendientes)}.
+        """
+        tiempo = np.asarray(tiempo, dtype=float)
+        orden = np.argsort(tiempo, kind='stable')
+        x = tiempo[orden]
+        valores = {'dpa': np.asarray(dpa, dtype=float)[orden], 'he': np.asarray(he, dtype=float)[orden]}
+        repetidas = np.diff(x) == 0
+        for nombre, y in valores.items():
+            if np.any(repetidas & (np.diff(y) != 0)):
+                raise ValueError("la historia tiene tiempos repetidos con distinto {} (t = {})".format(
+                    nombre, np.unique(x[1:][repetidas & (np.diff(y) != 0)]).tolist()))
+        unicas = np.concatenate(([True], ~repetidas))
+        x = x[unicas]
+        if len(x) < 2:
+            raise ValueError("la historia necesita al menos dos tiempos distintos")
+        historia = {'t': x}
+        for nombre, y in valores.items():
+            y = y[unicas]
+            h = np.diff(x)
+            d = np.diff(y) / h
+            m = np.full(len(x), d[0])
+            if len(x) > 2:
+                w1 = 2 * h[1:] + h[:-1]
+                w2 = h[1:] + 2 * h[:-1]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    interior = (w1 + w2) / (w1 / d[:-1] + w2 / d[1:])
+                m[1:-1] = np.where(d[:-1] * d[1:] > 0, interior, 0)
+                for i, (h0, h1, d0, d1) in ((0, (h[0], h[1], d[0], d[1])), (-1, (h[-1], h[-2], d[-1], d[-2]))):
+                    mi = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+                    if np.sign(mi) != np.sign(d0):
+                        mi = 0
+                    elif np.sign(d0) != np.sign(d1) and abs(mi) > abs(3 * d0):
+                        mi = 3 * d0
+                    m[i] = mi
+            historia[nombre] = (y, m)
+        return historia
+
+
+    def interpolarHistoria(self, nombre: str, t, derivada: bool = False):
+        """
+        Valor (o derivada respecto del tiempo en anios) de 'dpa' o 'he' de la historia tabulada para el tiempo de vida t
+        (escalar o array). Fuera de las muestras se extiende la recta tangente del extremo (las muestras cubren el tiempo de vida,
+        esto solo alcanza al punto t = (pasos + 1)/pasos de la grilla).
+        """
+        x = self.historia['t']
+        y, m = self.historia[nombre]
+        td = np.asarray(self.td(t), dtype=float)
+        k = np.clip(np.searchsorted(x, td, side='right') - 1, 0, len(x) - 2)
+        h = x[k + 1] - x[k]
+        u = np.clip((td - x[k]) / h, 0, 1)
+        if derivada:
+            v = ((6*u**2 - 6*u) * y[k] + (3*u**2 - 4*u + 1) * h * m[k] + (-6*u**2 + 6*u) * y[k + 1] + (3*u**2 - 2*u) * h * m[k + 1]) / h
+        else:
+            v = ((2*u**3 - 3*u**2 + 1) * y[k] + (u**3 - 2*u**2 + u) * h * m[k] + (-2*u**3 + 3*u**2) * y[k + 1] + (u**3 - u**2) * h * m[k + 1])
+            v = v + np.where(td < x[0], (td - x[0]) * m[0], 0) + np.where(td > x[-1], (td - x[-1]) * m[-1], 0)
+        return float(v) if v.ndim == 0 else v
+
+
+    def tabular(self, puntos: int) -> dict:
+        """
+        Evalua dpa, rateDpa, he y rateHe (Horner, np.polyval, o la historia tabulada) sobre la grilla de tiempo de vida
+        t = i/pasos, i = 0 ... puntos - 1. Devuelve un diccionario {nombre: lista de valores}.
+
+        Con integracion_he == 'rectangulo' se usan dpa(), rateDpa(), he() y rateHe() termino a termino, como la version original,
+        para que ese modo reproduzca exactamente los resultados anteriores (Horner redondea distinto y por encima de ~600 C
+        esa diferencia se amplifica).
+        """
+        if self.integracion_he == 'rectangulo' and self.historia is None:
+            t = [i / self.pasos for i in range(puntos)]
+            return {nombre: [getattr(self, nombre)(i) for i in t] for nombre in ("dpa", "rateDpa", "he", "rateHe")}
+
+        if self.historia is not None:
+            t = np.arange(puntos) / self.pasos
+            return {"dpa": self.interpolarHistoria('dpa', t).tolist(), "rateDpa": self.interpolarHistoria('dpa', t, derivada=True).tolist(),
+                    "he": self.interpolarHistoria('he', t).tolist(), "rateHe": self.interpolarHistoria('he', t, derivada=True).tolist()}
+
+        tds = self.td(np.arange(puntos) / self.pasos)
+        tablas = {}
+        for nombre, fit in (("dpa", self.dpa_fit), ("he", self.he_fit)):
+            p = np.asarray(fit, dtype=float)[::-1]
+            tablas[nombre] = np.polyval(p, tds).tolist()
+            tablas["rate" + nombre[0].upper() + nombre[1:]] = np.polyval(np.polyder(p), tds).tolist()
+        return tablas
+
+
+    def grilla(self, nombre: str, t: float) -> float:
+        """
+        Devuelve dpa, rateDpa, he o rateHe (segun nombre) para el tiempo de vida t.
+        Si t pertenece a la grilla t = i/pasos se lee de self.tablas, si no se evalua el polinomio directamente.
+        """
+        tabla = self.tablas[nombre]
+        i = round(t * self.pasos)
+        if 0 <= i < len(tabla) and i / self.pasos == t:
+            return tabla[i]
+        return getattr(self, nombre)(t)
+
+
     def GHe(self, f: float, t: float) -> float:                # Generacion de Helio
         """
         PROTECTED-COG Page 10, Ecuation (22)
@@ -151,9 +304,25 @@ class CavitySwelling:
         """
         PROTECTED-COG ecuacion 37 (segundo termino, no considera DENUDED ZONE)
         Helio total que migra a borde de grano
+
+        Como rateHe es la derivada de he respecto de td(t) = teol * t:
+            Teol * integral(GHe, 0, t) = f * (he(t) - he(0)) * Teol / (teol * 24 * 365 * 3600 * 1E6) = f * (he(t) - he(0)) / 1E6
         """
-        # usar integracion en casos no lineales
-        return (CavitySwelling.integrate(lambda tt: self.GHe(f,tt) , 0, t, 1000)) * self.Teol
+        if self.integracion_he == 'rectangulo':
+            # suma de Riemann original, se conserva para comparar resultados contra versiones anteriores
+            return (CavitySwelling.integrate(lambda tt: self.GHe(f,tt) , 0, t, 1000)) * self.Teol
+
+        return f * (self.grilla('he', t) - self.grilla('he', 0)) / 1E6
+
+
+    def heTotTabla(self, f: float) -> list:
+        """
+        Devuelve heTot(f, i/pasos) para i = 0 ... pasos + 1 (la grilla de tiempo de vida que recorre run()).
+        Se calcula una sola vez por objeto y por valor de f.
+        """
+        if f not in self._heTot:
+            self._heTot[f] = [self.heTot(f, i/self.pasos) for i in range(self.pasos + 2)]
+        return self._heTot[f]
 
 
     def CI(self, f:float, z:int, rM:float, d:float, ro:float, t:float, r:float, e:float) -> float:
@@ -161,10 +330,7 @@ class CavitySwelling:
         PROTECTED-PODG  Ecuacion 28, pagina 11
         Steady state point defect concentration (intersticiales)
         """
-        rdv = self.Rd(z, t, e)
-        rcv = self.Rc(d, ro, t)
-        ssgbv = self.ssgb(rM, d, ro, z, t, e)
-        return (self.G(f, t) / (((rdv * (1 + self.ba(z, t, e))) + rcv + ssgbv) * self.DI(z))) * self.Q(f, z, rM, d, ro, t, r, e) 
+        return self.sumideros(f, z, rM, d, ro, t, r, e)[8]
 
 
     def CE(self, z:int, efv:float) -> float:
@@ -183,11 +349,7 @@ class CavitySwelling:
         PROTECTED-COG ecuacion 27, pagina 11
         Steady-state point defect concentration (vacancias)
         """
-        return (
-            self.G(f, t)/
-            ((self.Rd(z, t, e) + self.Rc(d, ro, t) + self.ssgb(rM, d, ro, z, t, e)) * self.DV(z, e)) *
-            self.Q(f, z, rM, d, ro, t, r, e)
-        )
+        return self.sumideros(f, z, rM, d, ro, t, r, e)[7]
 
 
     def G(self, f:float, t:float) -> float:
@@ -201,7 +363,7 @@ class CavitySwelling:
 
         G == phi
         """
-        return f * (self.rateDpa(t) / (24 * 365 * 3600))
+        return f * (self.grilla('rateDpa', t) / (24 * 365 * 3600))
 
 
     def Rd(self, z:int, t:float, e:float) -> float:  # verificar e usada
@@ -225,7 +387,7 @@ class CavitySwelling:
                 
         Sink strength of the cavities within the matrix as a function of irradiation dose
         """
-        return self.ss(d, ro) * (self.dpa(t) / self.dpa(1)) #cambio 347H
+        return self.ss(d, ro) * (self.grilla('dpa', t) / self.grilla('dpa', 1)) #cambio 347H
 
 
     def ssgb(self, rM:float, d:float, ro:float, z:int, t:float, e:float) -> float:
@@ -259,9 +421,7 @@ class CavitySwelling:
 
         F(n) == Q
         """
-        n = self.n(f, z, rM, d, ro, t, r, e)
-
-        return (2/n) * ((1 + n)**0.5 - 1)
+        return self.sumideros(f, z, rM, d, ro, t, r, e)[5]
 
 
     def rr(self, z):
@@ -294,14 +454,45 @@ class CavitySwelling:
 
         phi == self.G(f,t)
             
+        """
+        return self.sumideros(f, z, rM, d, ro, t, r, e)[4]
+
+
+    def sumideros(self, f:float, z:int, rM:float, d:float, ro:float, t:float, r:float, e:float) -> tuple:
+        """
+        Evaluador fusionado de un paso de tiempo: calcula una sola vez el estado de sumideros para (z, t, d).
+
+        Devuelve (Rd, Rc, ssgb, ba, n, Q, G, C, CI). C, CI, Q y n son accesos a este resultado.
         """
         rdv = self.Rd(z, t, e)
         rcv = self.Rc(d, ro, t)
-        ssgbv = self.ssgb(rM, d, ro, z, t ,e)
+        Gv = self.G(f, t)
+        return (rdv, rcv) + CavitySwelling._sumideros(rdv, rcv, Gv, rM, self.DV(z, e), self.DI(z), self.a(z, r), self.lIa(z), self.lVa(z), log)
 
-        return (4 * self.a(z, r) * self.G(f, t)) / (
-            ((rdv * (1 + self.ba(z, t,e)) + rcv + ssgbv) * (rdv + rcv + ssgbv) * (self.DV(z, e) * self.DI(z)))
-        )
+
+    def _sumideros(rdv, rcv, Gv, rM, DV, DI, av, lIa, lVa, log) -> tuple:
+        """
+        Nucleo de sumideros() a partir de Rd, Rc, G y los terminos que solo dependen de la temperatura.
+        Sirve tanto para escalares (log = math.log) como para arrays de NumPy (log = np.log).
+
+        Devuelve (ssgb, ba, n, Q, G, C, CI).
+        """
+        ssgbv = (3 / (rM * 1E-9)) * ((rdv + rcv)**0.5)                       # ssgb
+
+        zIa = 2 * pi / log(2 * (((pi * rdv)**-0.5)/lIa))
+        zVa = 2 * pi / log(2 * (((pi * rdv)**-0.5)/lVa))
+        bav = (zIa - zVa) / zIa                                               # ba
+
+        sumI = (rdv * (1 + bav)) + rcv + ssgbv
+        sumV = rdv + rcv + ssgbv
+
+        nv = (4 * av * Gv) / (sumI * sumV * (DV * DI))                        # n
+        Qv = (2/nv) * ((1 + nv)**0.5 - 1)                                     # Q
+
+        Cv = Gv / (sumV * DV) * Qv                                            # C
+        CIv = (Gv / (sumI * DI)) * Qv                                         # CI
+
+        return ssgbv, bav, nv, Qv, Gv, Cv, CIv
 
 
     def a(self, z:int, r:int) -> float:          # Parametro de recombinacion
@@ -430,6 +621,73 @@ class CavitySwelling:
 
     #plot_graph([i + 573 for i in range(800)], rR, "i+573", "RRi", "J1")
 
+    def integrarAdaptativo(self, estado, AGB: float, res: np.ndarray) -> float:
+        """
+        Integra dAGB/dt = Teol * max(CJV, 0) (t: fraccion de tiempo de vida) con paso variable, usando el par embebido de
+        Bogacki-Shampine (orden 3 con estimador de orden 2): el paso se acepta si el error estimado es <= tolerancia * |AGB|
+        (o si ya es paso_min) y el siguiente se ajusta con ese error, entre paso_min y paso_max.
+
+            estado: funcion (AGB, t, helio, dpa, rateDpa) -> (YB, PB, CGB, CJV, radio, ss) de run().
+
+            res: resultados de run(), se completan las filas 1 ... sobre la grilla t = i/pasos interpolando los pasos aceptados
+                 (AGBS con Hermite cubico usando la derivada, el resto de las columnas linealmente).
+
+        Devuelve el AGB al final de la grilla. La cantidad de pasos queda en self.integracion.
+        """
+        f = self.f
+        fin = (len(res) - 1) / self.pasos
+
+        def derivada(AGB, t):
+            fila = estado(AGB, t, self.heTot(f, t), self.grilla('dpa', t), self.grilla('rateDpa', t))
+            return fila, (self.Teol * fila[3] if fila[3] > 0 else 0.0)
+
+        t = 0.0
+        h = min(1 / self.pasos, self.paso_max)
+        fila, k1 = derivada(AGB, t)
+        ts, ys, dys, filas = [t], [AGB], [k1], [fila]
+        evaluaciones, rechazados = 1, 0
+
+        while fin - t > 1E-12:
+            h = min(h, fin - t)
+            k2 = derivada(AGB + h/2 * k1, t + h/2)[1]
+            k3 = derivada(AGB + 3*h/4 * k2, t + 3*h/4)[1]
+            nuevo = AGB + h * (2/9 * k1 + 1/3 * k2 + 4/9 * k3)
+            fila4, k4 = derivada(nuevo, t + h)
+            evaluaciones += 3
+
+            err = abs(h * (-5/72 * k1 + 1/12 * k2 + 1/9 * k3 - 1/8 * k4))     # diferencia con la solucion de orden 2
+            tol = self.tolerancia * abs(nuevo)
+            if err <= tol or h <= self.paso_min:
+                t, AGB, fila, k1 = t + h, nuevo, fila4, k4                       # k4 es la primera etapa del paso siguiente
+                ts.append(t)
+                ys.append(AGB)
+                dys.append(k1)
+                filas.append(fila)
+            else:
+                rechazados += 1
+
+            factor = 0.9 * (tol / err)**(1/3) if err > 0 else 5.0
+            h = min(self.paso_max, max(self.paso_min, h * min(5.0, max(0.2, factor))))
+
+        ts, ys, dys = np.array(ts), np.array(ys), np.array(dys)
+        filas = np.array(filas)
+
+        # interpolacion sobre la grilla t = i/pasos
+        tg = np.arange(1, len(res)) / self.pasos
+        k = np.clip(np.searchsorted(ts, tg, side='right') - 1, 0, len(ts) - 2)
+        dt = ts[k + 1] - ts[k]
+        u = (tg - ts[k]) / dt
+        res["AGBS"][1:] = ((2*u**3 - 3*u**2 + 1) * ys[k] + (u**3 - 2*u**2 + u) * dt * dys[k]
+                           + (-2*u**3 + 3*u**2) * ys[k + 1] + (u**3 - u**2) * dt * dys[k + 1])
+        for j, campo in enumerate(("YB", "PB", "CGB", "CJVS", "RADIO", "SS")):
+            res[campo][1:] = np.interp(tg, ts, filas[:, j])
+        res["DPA"][1:] = self.tablas['dpa'][1:len(res)]
+        res["HELIO"][1:] = self.heTotTabla(f)[1:len(res)]
+
+        self.integracion = {'pasos': len(ts) - 1, 'rechazados': rechazados, 'evaluaciones': evaluaciones}
+        return float(ys[-1])
+
+
     def run(self, silent:bool=False) -> None:
 
         """ Inicializa el algoritmo para el calculo de Swelling, todos los resultados se guardan como atributos dentro del objeto CavitySwelling """
@@ -455,21 +713,12 @@ class CavitySwelling:
         #inicializacion de parametros:
         AGB = self.heTot(f, self.fi)
 
-        final = 100
+        final = self.pasos
         rango = final + 2
 
-        #inicializacion de listas:
-        self.AGBS = [0 for i in range(rango)]
-        self.YB = [0 for i in range(rango)]                    
-        self.PB = [0 for i in range(rango)]                
-        self.CGB = [0 for i in range(rango)]                 
-        self.CJVS = [0 for i in range(rango)]            
-        self.DPA = [0 for i in range(rango)]                
-        self.HELIO = [0 for i in range(rango)]               
-        self.RADIO = [0 for i in range(rango)]
-        self.SS = [0 for i in range(rango)]              
-
-        self.AGBS[0] = AGB
+        #inicializacion de resultados:
+        res = np.zeros(rango, dtype=[(campo, float) for campo in CavitySwelling.CAMPOS])
+        res["AGBS"][0] = AGB
 
         #Funciones y constantes que se pueden calcucar fuera del ciclo For (OPTIMIZACIONES)
         C1 = 6 / (PI * rho1z * 1E-4)
@@ -477,15 +726,20 @@ class CavitySwelling:
         C3 = omega * 6.023E23
         C4 = (efv-0.1) * (1.6E-19)
         C5 = 1.38 * 1E-23
-        C6 = self.Teol/100
+        C6 = self.Teol/final
 
         DV = self.DV(z, e)
         CE = self.CE(z, efv)
         DI = self.DI(z)
+        AZ = self.a(z, r)
+        LIA = self.lIa(z)
+        LVA = self.lVa(z)
+        HE = self.heTotTabla(f)
+        DPA = self.tablas['dpa']
+        RDPA = self.tablas['rateDpa']
 
-        for i in range(1, rango):
-
-            hefi5 = self.heTot(f, i/100)
+        def estado(AGB, t, hefi5, dpa, rdpa):
+            """ Estado de las cavidades para el swelling AGB en el tiempo de vida t. Devuelve (YB, PB, CGB, CJV, radio, ss). """
 
             vTerm = (AGB * C1)**(1/3)        # incremento de radio
 
@@ -504,33 +758,38 @@ class CavitySwelling:
             #CJV = (self.Rc(vTerm, rho1z, i/100) * self.DV(z, e) *
             #(self.C(uf, z, rM, vTerm, rho1z, i/100, r, e) + self.CE(z, efv) - CGB)) + ((-(self.Rc(vTerm, rho1z, i/100))) * self.DI(z) * self.CI(uf, z, rM, vTerm, rho1z, i/100, r, e))
             
-            CJV = (self.Rc(vTerm, rho1z, i/100) * DV *
-            (self.C(uf, z, rM, vTerm, rho1z, i/100, r, e) + CE - CGB)) + ((-(self.Rc(vTerm, rho1z, i/100))) * DI * self.CI(uf, z, rM, vTerm, rho1z, i/100, r, e))
-            
-            AGB = AGB + ((CJV * C6) if CJV > 0 else 0)
-            #print('AGB: ', AGB)
-            
-            self.AGBS[i] = AGB
-            self.YB[i] = YB
-            self.PB[i] = PB
-            self.CGB[i] = CGB
-            self.CJVS[i] = CJV
-            self.DPA[i] = self.dpa(i/100)
-            self.HELIO[i] = hefi5
-            self.RADIO[i] = radio
-            self.SS[i] = self.ss(vTerm, rho1z)
-
-        SWELL = [i*100 for i in self.AGBS]                       #SWELL = [i*100 for i in self.AGBS]
-        
-        HE_SWELL = [i * 1E-4 for i in self.HELIO]                   #HE_SWELL = [i/10000 for i in self.HELIO] # HE * E-4 = [%]
-        
-        header = ["i", "Vol","AGBS [%]" , "YB", "PB", "CGB", "CJV", "DPA", "HELIO", "HE [%]", "RADIO", "SS"]
-        
-        self.rv = tabulate.tabulate(CavitySwelling.transpose([range(0,rango), self.AGBS , SWELL , self.YB , self.PB , self.CGB, self.CJVS , self.DPA , self.HELIO , HE_SWELL, self.RADIO, self.SS]), headers=header)
+            rdv = self.Rd(z, t, e)
+            rcv = self.ss(vTerm, rho1z) * (dpa / DPA[final])                  # self.Rc(vTerm, rho1z, t)
+            G = uf * (rdpa / (24 * 365 * 3600))                                 # self.G(uf, t)
+            Cv, CIv = CavitySwelling._sumideros(rdv, rcv, G, rM, DV, DI, AZ, LIA, LVA, log)[5:]
+
+            CJV = (rcv * DV * (Cv + CE - CGB)) + ((-rcv) * DI * CIv)
+
+            return YB, PB, CGB, CJV, radio, self.ss(vTerm, rho1z)
+
+        if self.integrador == 'adaptativo':
+            AGB = self.integrarAdaptativo(estado, AGB, res)
+        else:
+            for i in range(1, rango):
+
+                YB, PB, CGB, CJV, radio, ssv = estado(AGB, i/final, HE[i], DPA[i], RDPA[i])
+
+                AGB = AGB + ((CJV * C6) if CJV > 0 else 0)
+                #print('AGB: ', AGB)
+
+                res[i] = (AGB, YB, PB, CGB, CJV, DPA[i], HE[i], radio, ssv)
+
+            self.integracion = {'pasos': rango - 1, 'rechazados': 0, 'evaluaciones': rango - 1}
+
+        self.resultados = res
+        for campo in CavitySwelling.CAMPOS:
+            setattr(self, campo, res[campo])
+
+        self._rv = None                 # la tabla se genera recien cuando se lee self.rv
         
         if not silent:      #si silent ==False ejecuta este codigo.
             try:
-                #CavitySwelling.plot_graph([i/100  for i in range(0, final + 2)], AGBS, "Time (s)", "Volume", "Cavity Swelling", z, True, 1)  
+                #CavitySwelling.plot_graph([i/final  for i in range(0, final + 2)], AGBS, "Time (s)", "Volume", "Cavity Swelling", z, True, 1)  
                 pass
 
             except Exception as e:
@@ -542,6 +801,196 @@ class CavitySwelling:
         return None
 
 
+    @property
+    def rv(self) -> str:
+        """ Tabla (tabulate) con los resultados de la ultima corrida. Se genera la primera vez que se pide. """
+        if self._rv is None and self.resultados is not None:
+            self._rv = self.tabla()
+        return self._rv
+
+
+    def tabla(self) -> str:
+        """ Genera la tabla de resultados de la ultima corrida con tabulate. """
+        res = self.resultados
+
+        SWELL = res["AGBS"] * 100
+        
+        HE_SWELL = res["HELIO"] * 1E-4                   # HE * E-4 = [%]
+        
+        header = ["i", "Vol","AGBS [%]" , "YB", "PB", "CGB", "CJV", "DPA", "HELIO", "HE [%]", "RADIO", "SS"]
+
+        columnas = [range(0, len(res)), res["AGBS"], SWELL, res["YB"], res["PB"], res["CGB"], res["CJVS"], res["DPA"], res["HELIO"], HE_SWELL, res["RADIO"], res["SS"]]
+        
+        return tabulate.tabulate(CavitySwelling.transpose([list(c) for c in columnas]), headers=header)
+
+
+    def run_batch(self, zs) -> dict:
+
+        """
+        Ejecuta el mismo algoritmo que run() (integrador de Euler) para varias temperaturas a la vez: cada operacion del paso de
+        tiempo se aplica con NumPy a todas las temperaturas juntas.
+
+            zs: temperaturas en grados Kelvin (se ignora self.z).
+
+        El helio total (heTot) y el DPA no dependen de la temperatura, y Rd, G y ba no dependen del swelling, por lo que se calculan
+        para toda la grilla antes de recorrer los pasos; dentro del ciclo solo queda lo que depende de AGB.
+
+        Devuelve un diccionario con una fila por temperatura para AGBS, YB, PB, CGB, CJVS, RADIO y SS, las columnas comunes DPA y HELIO,
+        el diametro final deol y la mascara ok. Las temperaturas en las que run() lanzaria una excepcion (AGB negativo, YB == 1, overflow en CGB)
+        quedan con ok == False y sus valores en NaN.
+
+        np.exp, np.log y las potencias de NumPy pueden redondear distinto que las de math en el ultimo bit. Hasta ~580 C el swelling de fin
+        de vida coincide con run() a menos de 1E-7 (relativo); por encima el termino (C + CE - CGB) sufre cancelacion y el corte CJV > 0
+        amplifica esas diferencias (hasta ~15 % entre 600 y 650 C con los ajustes de datos.txt, igual que run() ante cualquier cambio de
+        redondeo). verificar_batch compara ambos caminos.
+        """
+
+        z = np.atleast_1d(np.asarray(zs, dtype=float))
+        nz = len(z)
+
+        omega = self.omega
+        s = self.s
+        efv = self.efv
+        rM = self.rM
+        r = self.r
+        e = self.e
+        f = self.f
+        uf = self.uf
+        PI = pi
+
+        final = self.pasos
+        rango = final + 2
+
+        # resultados por paso (filas) y temperatura (columnas); se trasponen al final
+        AGBS = np.zeros((rango, nz))
+        YB = np.zeros((rango, nz))
+        PB = np.zeros((rango, nz))
+        CGB = np.zeros((rango, nz))
+        CJVS = np.zeros((rango, nz))
+        VTERM = np.zeros((rango, nz))
+        DPA = np.zeros(rango)
+        HELIO = np.zeros(rango)
+        DPA[1:] = self.tablas['dpa'][1:rango]
+        HELIO[1:] = self.heTotTabla(f)[1:rango]
+
+        AGB = np.full(nz, self.heTot(f, self.fi))
+        AGBS[0] = AGB
+
+        with np.errstate(all='ignore'):
+
+            # Terminos que solo dependen de la temperatura
+            rho1z = self.rho1(z)
+            rRt = np.asarray(self.rR)[(z - 473).astype(int)] * 1E14
+            rrz = self.rr(z)
+            DV = 6 * 1E-6 * np.exp(-e * 1.6E-19 / (1.38E-23 * z))
+            DI = 12E-6 * np.exp((-0.15 * 1.6E-19)/(1.38E-23 * z))
+            CE = np.exp(-(efv) * 1.6E-19 / (1.38E-23 * z))
+            az = 1E19 * r * DI                                  # self.a(z, r)
+            lIa = self.lIa(z)
+            lVa = self.lVa(z)
+
+            C1 = 6 / (PI * rho1z * 1E-4)
+            C2 = (2E-10)**3 / (6 * omega)
+            C3 = omega * 6.023E23
+            C4 = (efv-0.1) * (1.6E-19)
+            C5 = 1.38 * 1E-23
+            C6 = self.Teol/final
+            dpa1 = self.tablas['dpa'][final]
+
+            # Terminos que no dependen del swelling, para toda la grilla (paso x temperatura): Rd, G y ba de _sumideros
+            t = (np.arange(rango) / final)[:, None]
+            RD = (rRt * 0.4) / (((rRt - self.N0) / self.N0) * (e**(-rrz * t * 300)) + 1)
+            GS = uf * (np.asarray(self.tablas['rateDpa'][:rango]) / (24 * 365 * 3600))
+            zIa = 2 * pi / np.log(2 * (((pi * RD)**-0.5)/lIa))
+            zVa = 2 * pi / np.log(2 * (((pi * RD)**-0.5)/lVa))
+            BA = (zIa - zVa) / zIa
+            PC = z * C5
+            PZ = 8.31 * z
+            DVI = DV * DI
+            C7 = 3 / (rM * 1E-9)
+
+            for i in range(1, rango):
+
+                hefi5 = HELIO[i]
+                rdv = RD[i]
+
+                vTerm = (AGB * C1)**(1/3)
+
+                YBi = PI * C2 * (hefi5 / AGB)
+
+                PBi = ((1 + YBi + YBi**2 - YBi**3) / ((1 - YBi) ** 3)) * ((hefi5 /(C3 * AGB)) * PZ)
+                PBi[PBi < 0] = 0
+
+                CGBi = np.exp(-( C4 + ((PBi - ((2*s) / ((vTerm/2) * 1E-9))) * omega)) / PC)
+
+                # Sink strengths para todas las temperaturas (mismo calculo que _sumideros con Rd y ba precalculados)
+                rcv = self.ss(vTerm, rho1z) * (DPA[i] / dpa1)
+                ssgbv = C7 * ((rdv + rcv)**0.5)
+                sumI = (rdv * (1 + BA[i])) + rcv + ssgbv
+                sumV = rdv + rcv + ssgbv
+                nv = (4 * az * GS[i]) / (sumI * sumV * DVI)
+                Qv = (2/nv) * ((1 + nv)**0.5 - 1)
+                C = GS[i] / (sumV * DV) * Qv
+                CI = (GS[i] / (sumI * DI)) * Qv
+
+                CJV = (rcv * DV * (C + CE - CGBi)) + ((-rcv) * DI * CI)
+
+                AGB = AGB + np.where(CJV > 0, CJV * C6, 0)
+
+                AGBS[i] = AGB
+                YB[i] = YBi
+                PB[i] = PBi
+                CGB[i] = CGBi
+                CJVS[i] = CJV
+                VTERM[i] = vTerm
+
+            ok = ((AGBS[:-1] > 0) & (YB[1:] != 1) & np.isfinite(PB[1:]) & np.isfinite(CGB[1:]) & np.isfinite(CJVS[1:])).all(axis=0)
+            RADIO = (VTERM/2)*1E-9
+            SS = self.ss(VTERM, rho1z)
+            deol = (AGB*6/pi/rho1z/0.0001)**0.333
+
+        res = {"z": z, "DPA": DPA, "HELIO": HELIO, "ok": ok}
+        for nombre, arr in (("AGBS", AGBS), ("YB", YB), ("PB", PB), ("CGB", CGB), ("CJVS", CJVS), ("RADIO", RADIO), ("SS", SS)):
+            arr = arr.T.copy()
+            arr[~ok] = np.nan
+            res[nombre] = arr
+        deol[~ok] = np.nan
+        res["deol"] = deol
+        return res
+
+
+    def verificar_batch(self, temperaturas=range(200, 660, 10), tolerancia: float = 1E-6, tolerancia_alta: float = 0.2, T_alta: float = 580) -> list:
+        """
+        Compara run_batch contra run() (integrador de Euler) corrida temperatura por temperatura (grados C) con los mismos parametros.
+
+            tolerancia: diferencia relativa admitida en el swelling de fin de vida hasta T_alta (redondeo).
+
+            tolerancia_alta: diferencia relativa admitida por encima de T_alta, donde la cancelacion en (C + CE - CGB) amplifica el redondeo.
+
+        Devuelve la lista de (T [C], diferencia relativa) de las temperaturas fuera de tolerancia, con diferencia None si solo uno de
+        los dos caminos falla. Una lista vacia indica que coinciden.
+        """
+        res = self.run_batch([t + 273 for t in temperaturas])
+        distintas = []
+        for k, t in enumerate(temperaturas):
+            cs = copy.copy(self)
+            cs.z = t + 273
+            cs.integrador = 'euler'
+            try:
+                cs.run(silent=True)
+            except Exception:
+                if res["ok"][k]:
+                    distintas.append((t, None))
+                continue
+            if not res["ok"][k]:
+                distintas.append((t, None))
+                continue
+            diferencia = abs(res["AGBS"][k, cs.pasos] / cs.AGBS[cs.pasos] - 1)
+            if diferencia > (tolerancia_alta if t > T_alta else tolerancia):
+                distintas.append((t, float(diferencia)))
+        return distintas
+
+
 if __name__ == "__main__":
     import os
     os.system('python run_mtsf.py')
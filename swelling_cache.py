@@ -0,0 +1,133 @@
+"""
+Cache en disco de corridas de CavitySwelling.
+
+Cada corrida se guarda en un archivo .npz cuyo nombre es el hash de las entradas de CavitySwelling
+(he_fit, dpa_fit, z, uf, omega, s, efv, rM, r, e, f, teol, N0, fi) y del codigo de swelling.py,
+de modo que cambiar un ajuste o un parametro en datos.txt solo recalcula los puntos afectados.
+
+"""
+
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+
+import swelling
+
+
+class ResultCache:
+
+    """
+    Cache de resultados (trayectoria AGBS, deol y error) indexada por el hash de las entradas.
+
+        directorio: carpeta donde se guardan los archivos .npz.
+
+        maxBytes: tamanio maximo de la cache, al superarlo se borran los archivos usados hace mas tiempo.
+
+        activo: False desactiva la cache (get devuelve siempre None y put no guarda nada).
+
+    Para no recorrer la carpeta en cada put, cada objeto lleva un total del tamanio de la cache: se obtiene recorriendo la carpeta
+    la primera vez (y cada revisarCada puts, para sumar lo que escribieron otros procesos) y se actualiza con cada archivo guardado.
+    Solo cuando el total supera maxBytes se borran archivos, hasta bajar a fraccionBaja * maxBytes.
+    """
+
+    with open(swelling.__file__, 'rb') as _src:
+        VERSION = hashlib.sha256(_src.read()).hexdigest()          # hash del codigo del modelo
+
+    def __init__(self, directorio: str = ".swelling_cache", maxBytes: int = 200 * 2**20, activo: bool = True,
+                 revisarCada: int = 1000, fraccionBaja: float = 0.9) -> None:
+        self.directorio = directorio
+        self.maxBytes = maxBytes
+        self.activo = activo
+        self.revisarCada = revisarCada
+        self.fraccionBaja = fraccionBaja
+        self.total = None               # tamanio estimado de la cache (None -> hay que recorrer la carpeta)
+        self.puts = 0
+
+
+    def clave(self, he_fit, dpa_fit, z, uf, omega, s, efv, rM, r, e, f, teol, N0, fi) -> str:
+        """ Devuelve el hash (sha256) de las entradas de una corrida. """
+        entradas = ([float(i) for i in he_fit], [float(i) for i in dpa_fit],
+                    *(float(i) for i in (z, uf, omega, s, efv, rM, r, e, f, teol, N0, fi)))
+        return hashlib.sha256((ResultCache.VERSION + repr(entradas)).encode()).hexdigest()
+
+
+    def ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave + ".npz")
+
+
+    def get(self, clave: str):
+        """ Devuelve (AGBS, deol, error) si la corrida esta en la cache, si no None. """
+        if not self.activo:
+            return None
+        ruta = self.ruta(clave)
+        try:
+            with np.load(ruta) as data:
+                AGBS = data["AGBS"]
+                deol = float(data["deol"])
+                error = str(data["error"]) or None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            return None
+        try:
+            os.utime(ruta)              # marca el archivo como usado recientemente
+        except OSError:
+            pass                        # otro proceso lo borro despues de leerlo, el resultado leido sigue valiendo
+        return AGBS, deol, error
+
+
+    def put(self, clave: str, AGBS, deol: float, error: str = None) -> None:
+        """ Guarda una corrida en la cache y aplica el limite de tamanio. """
+        if not self.activo:
+            return None
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self.ruta(clave)
+        tmp = ruta + ".{}.tmp".format(os.getpid())
+        with open(tmp, 'wb') as ofile:
+            np.savez(ofile, AGBS=np.asarray(AGBS, dtype=float), deol=np.nan if deol is None else deol, error=error or "")
+        size = os.path.getsize(tmp)
+        os.replace(tmp, ruta)           # escritura atomica, varios procesos pueden escribir a la vez
+
+        self.puts += 1
+        if self.total is None or self.puts % self.revisarCada == 0:
+            self.total = self.size()
+        else:
+            self.total += size
+        if self.total > self.maxBytes:
+            self.evict()
+        return None
+
+
+    def archivos(self) -> list:
+        """ Devuelve [(mtime, tamanio, nombre)] de los archivos de la cache. """
+        archivos = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(".npz"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directorio, nombre))
+            except OSError:
+                continue
+            archivos.append((st.st_mtime, st.st_size, nombre))
+        return archivos
+
+
+    def size(self) -> int:
+        """ Tamanio total de la cache en disco (recorre la carpeta). """
+        return sum(i[1] for i in self.archivos())
+
+
+    def evict(self) -> None:
+        """ Borra los archivos usados hace mas tiempo hasta que la cache ocupe menos de fraccionBaja * maxBytes. """
+        archivos = self.archivos()
+        total = sum(i[1] for i in archivos)
+        for mtime, size, nombre in sorted(archivos):
+            if total <= self.fraccionBaja * self.maxBytes:
+                break
+            try:
+                os.remove(os.path.join(self.directorio, nombre))
+            except OSError:
+                pass
+            total -= size
+        self.total = total
+        return None
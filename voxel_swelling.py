@@ -0,0 +1,254 @@
+"""
+Herramientas para evaluar el swelling de muchos volumenes (voxels) de una pieza sin correr
+el calculo de swelling completo en cada uno.
+
+El swelling de un voxel solo depende de su temperatura y de la atenuacion del dpa, por lo que se
+puede tabular sobre una grilla (T, atenuacion) e interpolar.
+
+"""
+
+import hashlib
+from collections import OrderedDict
+from multiprocessing import Pool, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+
+class SwellingSurrogate:
+
+    """
+    Tabla precalculada de swelling sobre una grilla temperatura x atenuacion, interpolada linealmente.
+
+        calcular: funcion de swelling con la firma de calculate_swelling(app, atenuacion, T, parametros).
+
+        app: tiempo de vida (anios de plena potencia).
+
+        parametros: lista de parametros que recibe calcular.
+
+        T: (Tmin, Tmax, puntos) grilla de temperaturas en grados C.
+
+        atenuacion: (min, max, puntos) grilla de atenuacion del dpa.
+    """
+
+    def __init__(self, calcular, app: float, parametros: list, T: tuple = (200, 650, 46), atenuacion: tuple = (0, 1, 11)) -> None:
+
+        self.calcular = calcular
+        self.app = app
+        self.parametros = parametros
+        self.T = np.linspace(*T)
+        self.atenuacion = np.linspace(*atenuacion)
+
+        self.tabla = np.array([[self.evaluar(t, a) for a in self.atenuacion] for t in self.T])
+        self.interpolador = RegularGridInterpolator((self.T, self.atenuacion), self.tabla)
+
+
+    def evaluar(self, T: float, atenuacion: float) -> float:
+        """ Swelling calculado con la funcion original (sin interpolar). """
+        return self.calcular(self.app, atenuacion, T, self.parametros)
+
+
+    def __call__(self, T, atenuacion):
+        """ Swelling interpolado para uno o varios puntos. Los valores fuera de la grilla se llevan al borde. """
+        T = np.clip(np.asarray(T, dtype=float), self.T[0], self.T[-1])
+        atenuacion = np.clip(np.asarray(atenuacion, dtype=float), self.atenuacion[0], self.atenuacion[-1])
+        T, atenuacion = np.broadcast_arrays(T, atenuacion)
+        return self.interpolador(np.stack([T.ravel(), atenuacion.ravel()], axis=-1)).reshape(T.shape)
+
+
+    def error(self) -> dict:
+        """
+        Estima el error de interpolacion comparando contra la funcion original en el centro de cada celda de la grilla
+        (donde el error de la interpolacion bilineal es maximo). Requiere (nT - 1) * (nA - 1) evaluaciones extra.
+
+        Devuelve {'max': error absoluto maximo, 'medio': error absoluto medio, 'T': T del maximo, 'atenuacion': atenuacion del maximo}.
+        """
+        tc = (self.T[1:] + self.T[:-1]) / 2
+        ac = (self.atenuacion[1:] + self.atenuacion[:-1]) / 2
+        exacto = np.array([[self.evaluar(t, a) for a in ac] for t in tc])
+        tt, aa = np.meshgrid(tc, ac, indexing='ij')
+        err = np.abs(self(tt, aa) - exacto)
+        i, j = np.unravel_index(np.argmax(err), err.shape)
+        return {'max': float(err[i, j]), 'medio': float(err.mean()), 'T': float(tc[i]), 'atenuacion': float(ac[j])}
+
+
+class SwellingMemo:
+
+    """
+    Memoizacion de una funcion de swelling con la firma de calculate_swelling(app, atenuacion, T, parametros).
+
+    La temperatura se redondea a multiplos de tolerancia_T (y se calcula en ese valor redondeado), de modo que voxels
+    del mismo anillo con temperaturas casi iguales comparten resultado.
+
+        calcular: funcion de swelling original.
+
+        tolerancia_T: paso de redondeo de la temperatura en grados C; 0 (o negativo) no redondea y solo comparten resultado
+                      temperaturas identicas.
+
+        decimales_atenuacion: decimales con los que se redondea la atenuacion en la clave.
+
+        maxsize: cantidad maxima de resultados guardados, al superarla se descarta el usado hace mas tiempo (LRU).
+    """
+
+    def __init__(self, calcular, tolerancia_T: float = 0.5, decimales_atenuacion: int = 9, maxsize: int = 100000) -> None:
+
+        self.calcular = calcular
+        self.tolerancia_T = tolerancia_T
+        self.decimales_atenuacion = decimales_atenuacion
+        self.maxsize = maxsize
+
+        self.memo = OrderedDict()
+        self.hashes = {}                # id(parametros) -> (parametros, hash)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def hashParametros(self, parametros) -> str:
+        """ Hash de la lista de parametros (incluye los arrays de dpa y He). Se calcula una vez por objeto parametros. """
+        guardado = self.hashes.get(id(parametros))
+        if guardado is not None and guardado[0] is parametros:
+            return guardado[1]
+        h = hashlib.sha256()
+        for p in parametros:
+            h.update(np.asarray(p).tobytes() if isinstance(p, (list, np.ndarray)) else repr(p).encode())
+        self.hashes[id(parametros)] = (parametros, h.hexdigest())
+        return self.hashes[id(parametros)][1]
+
+
+    def __call__(self, app: float, atenuacion: float, T: float, parametros: list) -> float:
+        Tq = round(float(T) / self.tolerancia_T) * self.tolerancia_T if self.tolerancia_T > 0 else float(T)
+        clave = (app, round(float(atenuacion), self.decimales_atenuacion), Tq, self.hashParametros(parametros))
+
+        if clave in self.memo:
+            self.hits += 1
+            self.memo.move_to_end(clave)
+            return self.memo[clave]
+
+        self.misses += 1
+        valor = self.calcular(app, atenuacion, Tq, parametros)
+        self.memo[clave] = valor
+        if len(self.memo) > self.maxsize:
+            self.memo.popitem(last=False)
+            self.evictions += 1
+        return valor
+
+
+    def estadisticas(self) -> dict:
+        """ Devuelve {'hits', 'misses', 'evictions', 'tamanio', 'hit_ratio'}. """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'tamanio': len(self.memo),
+                'hit_ratio': self.hits / total if total else 0.0}
+
+
+def swelling_deduplicado(evaluar, atenuacion, T, tolerancia_T: float = 0.0, decimales_atenuacion: int = 9) -> tuple:
+    """
+    Agrupa los voxels con las mismas entradas fisicas (atenuacion, T), evalua el swelling una vez por grupo y
+    copia el resultado a todos los voxels del grupo.
+
+        evaluar: funcion (atenuacion, T) -> array de swelling para arrays de puntos (secuencial o swelling_paralelo).
+
+        tolerancia_T: 0 agrupa temperaturas identicas; > 0 redondea T a multiplos de tolerancia_T y evalua en el valor redondeado.
+
+        decimales_atenuacion: decimales con los que se compara la atenuacion.
+
+    Devuelve (swelling por voxel, {'voxels': N, 'grupos': evaluaciones, 'ratio': N / grupos}).
+    """
+    atenuacion = np.round(np.asarray(atenuacion, dtype=float), decimales_atenuacion)
+    T = np.asarray(T, dtype=float)
+    if tolerancia_T > 0:
+        T = np.round(T / tolerancia_T) * tolerancia_T
+
+    claves, inversa = np.unique(np.stack([atenuacion.ravel(), T.ravel()], axis=1), axis=0, return_inverse=True)
+    valores = np.asarray(evaluar(claves[:, 0], claves[:, 1]), dtype=float)
+
+    info = {'voxels': T.size, 'grupos': len(claves), 'ratio': T.size / len(claves) if len(claves) else 1.0}
+    return valores[inversa.ravel()].reshape(T.shape), info
+
+# Estado de cada proceso del pool de swelling_paralelo (se carga una vez por proceso en _iniciar_proceso)
+_proceso = {}
+
+
+def _compartir(array: np.ndarray, memorias: list) -> tuple:
+    """ Copia un array a memoria compartida y devuelve su descriptor (nombre, forma, dtype). """
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    memorias.append(shm)
+    return (shm.name, array.shape, array.dtype.str)
+
+
+def _numerico(p):
+    """ Devuelve p como array si es un array o una lista / tupla de numeros (se comparte por memoria), si no None. """
+    if isinstance(p, np.ndarray):
+        return np.ascontiguousarray(p)
+    if isinstance(p, (list, tuple)) and len(p) > 0:
+        array = np.asarray(p)
+        if array.dtype.kind in 'biuf':
+            return np.ascontiguousarray(array)
+    return None
+
+
+def _abrir(descriptor: tuple, memorias: list) -> np.ndarray:
+    nombre, forma, dtype = descriptor
+    shm = SharedMemory(name=nombre)
+    memorias.append(shm)
+    return np.ndarray(forma, dtype=dtype, buffer=shm.buf)
+
+
+def _iniciar_proceso(calcular, app, parametros, atenuacion, T, salida) -> None:
+    memorias = []
+    _proceso['memorias'] = memorias
+    _proceso['calcular'] = calcular
+    _proceso['app'] = app
+    _proceso['parametros'] = [_abrir(p[1], memorias) if isinstance(p, tuple) and p[0] == 'shm' else p for p in parametros]
+    _proceso['atenuacion'] = _abrir(atenuacion, memorias)
+    _proceso['T'] = _abrir(T, memorias)
+    _proceso['salida'] = _abrir(salida, memorias)
+
+
+def _calcular_bloque(rango: tuple) -> None:
+    desde, hasta = rango
+    calcular, app, parametros = _proceso['calcular'], _proceso['app'], _proceso['parametros']
+    atenuacion, T, salida = _proceso['atenuacion'], _proceso['T'], _proceso['salida']
+    for i in range(desde, hasta):
+        salida[i] = calcular(app, float(atenuacion[i]), float(T[i]), parametros)
+
+
+def swelling_paralelo(calcular, app: float, atenuacion, T, parametros: list, procesos: int = None, bloque: int = 1000) -> np.ndarray:
+    """
+    Evalua calcular(app, atenuacion[i], T[i], parametros) para todos los voxels repartiendo bloques de indices en un pool de procesos.
+
+    Los arrays de atenuacion, temperatura y resultado (y los arrays y listas numericas de parametros, por ejemplo dpa, He y
+    tiempo) se pasan por memoria compartida: a los procesos solo se les envia el rango de indices de cada bloque. En los procesos
+    las listas numericas de parametros llegan como np.ndarray. Cada bloque escribe en su propia porcion
+    del resultado, por lo que el orden no depende de los procesos.
+
+        procesos: cantidad de procesos (None -> cpu_count()).
+
+        bloque: cantidad de voxels por tarea.
+
+    El script que la llame debe proteger su codigo con if __name__ == '__main__' (necesario en Windows).
+    """
+    atenuacion = np.ascontiguousarray(atenuacion, dtype=float)
+    T = np.ascontiguousarray(np.broadcast_to(T, atenuacion.shape), dtype=float)
+    n = len(T)
+
+    memorias = []
+    try:
+        arrays = [_numerico(p) for p in parametros]
+        desc_parametros = [p if a is None else ('shm', _compartir(a, memorias)) for p, a in zip(parametros, arrays)]
+        desc_atenuacion = _compartir(atenuacion, memorias)
+        desc_T = _compartir(T, memorias)
+        desc_salida = _compartir(np.zeros(n), memorias)
+
+        rangos = [(i, min(i + bloque, n)) for i in range(0, n, bloque)]
+        with Pool(processes=procesos or cpu_count(), initializer=_iniciar_proceso,
+                  initargs=(calcular, app, desc_parametros, desc_atenuacion, desc_T, desc_salida)) as pool:
+            pool.map(_calcular_bloque, rangos)
+
+        return np.ndarray(n, dtype=float, buffer=memorias[-1].buf).copy()
+    finally:
+        for shm in memorias:
+            shm.close()
+            shm.unlink()